@@ -1,4 +1,7 @@
+import gzip
+import io
 import logging
+import os
 import shutil
 import tempfile
 
@@ -19,6 +22,8 @@ class Configuration:
     * A hook: An object or function used to access data, e.g. S3
     * A file path: A data file to load as the source of data, e.g. data.csv
     * A QueryBuilder class: instantiate and use to build a SQL query
+    * A row limit: restrict the query to the first n rows, e.g. for testing. The built-in
+      query builders apply this with Postgres-style LIMIT, not SQL Server's TOP
     """
 
     def __init__(self,
@@ -28,7 +33,8 @@ class Configuration:
                  schema: str = None,
                  file_path: str = None,
                  query_builder=None,
-                 user: str = None
+                 user: str = None,
+                 row_limit: int = None
                  ):
         self.connection_string = connection_string
         self.hook = hook
@@ -37,6 +43,7 @@ class Configuration:
         self.file_path = file_path
         self.query_builder = query_builder
         self.user = user
+        self.row_limit = row_limit
 
 
 class DataExtractor:
@@ -121,6 +128,9 @@ class DataExtractor:
         for item in self.dataset_specification.items:
             if self.metadata.get_metadata(item) and not self.metadata.get_metadata(item).get_property('formula'):
                 columns_to_keep.append(self.__get_column_name__(item))
+        # Already minimised, e.g. by validate_data(); skip making another copy
+        if list(self._data.columns) == columns_to_keep:
+            return
         self._data = self._data[columns_to_keep]
 
     def __get_measure__(self, measure=None):
@@ -133,13 +143,36 @@ class DataExtractor:
         return measure
 
     def get_total(self, measure=None):
-        df = self.get_data_frame()
         measure = self.__get_measure__(measure)
         if measure is None:
-            return len(df)
+            # The row count doesn't depend on which columns are kept, so skip minimising
+            return len(self.get_data_frame(minimise=False))
+        df = self.get_data_frame()
         self._total = df[measure].sum()
         return self._total
 
+    def __get_measures__(self, measures=None):
+        if measures is None:
+            # Calculated fields aren't present in the data, so can't be totalled
+            return [
+                measure for measure in self.dataset_specification.measures
+                if self.metadata.get_metadata(measure) is None
+                or not self.metadata.get_metadata(measure).get_property('formula')
+            ]
+        for measure in measures:
+            self.__get_measure__(measure)
+        return measures
+
+    def get_totals(self, measures=None) -> dict:
+        """
+        Totals several measures in a single pass over the data
+        :param measures: the measures to total; defaults to all the non-calculated measures in the specification
+        :return: a dict of totals, keyed by measure
+        """
+        measures = self.__get_measures__(measures)
+        df = self.get_data_frame()
+        return df[measures].sum().to_dict()
+
     def validate_data(self, allow_nulls=True):
         from mario.validation import DataFrameValidator
         validator = DataFrameValidator(
@@ -236,6 +269,7 @@ class StreamingDataExtractor(DataExtractor):
                  ):
         super().__init__(configuration, dataset_specification, metadata)
         self._data = None
+        self._engine = None
 
     def get_data_frame(self, minimise=True) -> DataFrame:
         if self._data is None:
@@ -249,15 +283,20 @@ class StreamingDataExtractor(DataExtractor):
                            "to be re-streamed from source into a temporary file. If this is "
                            "not what you had in mind, first stream the data to file, and "
                            "then load the file in a DataExtractor")
-            with tempfile.TemporaryFile() as file:
-                self.stream_sql_to_hyper(file_path=file.name, validate=True, allow_nulls=allow_nulls)
+            with tempfile.TemporaryDirectory() as temp_folder:
+                file_path = os.path.join(temp_folder, 'data.hyper')
+                self.stream_sql_to_hyper(file_path=file_path, validate=True, allow_nulls=allow_nulls)
         else:
             super().validate_data(allow_nulls=allow_nulls)
 
     def get_connection(self):
-        from sqlalchemy import create_engine
-        engine = create_engine(self.configuration.connection_string)
-        connection = engine.connect().execution_options(stream_results=True)
+        # Create the engine once so its connection pool is reused between streams.
+        # Close the connection when finished with it, e.g. with a 'with' block, to
+        # return it to the pool
+        if self._engine is None:
+            from sqlalchemy import create_engine
+            self._engine = create_engine(self.configuration.connection_string)
+        connection = self._engine.connect().execution_options(stream_results=True)
         return connection
 
     def save_data_as_csv(self, file_path: str, minimise=False):
@@ -280,20 +319,41 @@ class StreamingDataExtractor(DataExtractor):
         from the main query and use the results of this
         :return: the total value of the query
         """
-        logger.info("Building totals query")
         measure = self.__get_measure__(measure)
+        totals_df = self.__read_totals__(measure=measure)
+        return totals_df.iat[0, 0]
+
+    def get_totals(self, measures=None) -> dict:
+        """
+        There's no data frame to total over when streaming, so this runs
+        a single totals SQL query for all the measures
+        :return: a dict of totals, keyed by measure
+        """
+        measures = self.__get_measures__(measures)
+        if len(measures) == 0:
+            return {}
+        totals_df = self.__read_totals__(measures=measures)
+        return dict(zip(measures, totals_df.iloc[0]))
+
+    def __read_totals__(self, measure=None, measures=None) -> DataFrame:
+        """ Runs the totals query from the query builder and returns the result """
+        logger.info("Building totals query")
         if self.configuration.query_builder is not None:
             from mario.query_builder import QueryBuilder
             query_builder: QueryBuilder = self.configuration.query_builder(
                 configuration=self.configuration,
                 metadata=self.metadata,
                 dataset_specification=self.dataset_specification)
-            totals_query = query_builder.create_totals_query(measure=measure)
+            if measures is None:
+                # Query builders written before multi-measure totals only take a measure
+                totals_query = query_builder.create_totals_query(measure=measure)
+            else:
+                totals_query = query_builder.create_totals_query(measures=measures)
         else:
             raise NotImplementedError
 
-        totals_df = pd.read_sql(totals_query[0], self.get_connection(), params=totals_query[1])
-        return totals_df.iat[0, 0]
+        with self.get_connection() as connection:
+            return pd.read_sql(totals_query[0], connection, params=totals_query[1])
 
     def stream_sql_to_hyper(self,
                             file_path: str,
@@ -313,17 +373,34 @@ class StreamingDataExtractor(DataExtractor):
         from tableauhyperapi import TableName
         from pantab import frame_to_hyper
 
-        connection = self.get_connection()
         table_name = TableName(schema, table)
-        for df in pd.read_sql(self._query[0], connection, chunksize=chunk_size):
-            if validate or minimise:
-                self._data = df
-                if validate:
-                    self.validate_data(allow_nulls=allow_nulls)
-                if minimise:
-                    self.__minimise_data__()
-                    df = self._data
-            frame_to_hyper(df, database=file_path, table=table_name, table_mode='a')
+        with self.get_connection() as connection:
+            for df in pd.read_sql(self._query[0], connection, chunksize=chunk_size):
+                if validate or minimise:
+                    self._data = df
+                    if validate:
+                        self.validate_data(allow_nulls=allow_nulls)
+                    if minimise:
+                        self.__minimise_data__()
+                        df = self._data
+                frame_to_hyper(df, database=file_path, table=table_name, table_mode='a')
+
+    def __open_gzip__(self, file_path: str, compression_level: int):
+        """
+        Opens a gzip file for writing text. Uses ISA-L's igzip where the
+        isal package is installed, as it is several times faster than zlib;
+        it supports levels 0-3, so higher levels fall back to zlib.
+        mtime is fixed at 0 so that the same data always gives the same bytes.
+        """
+        gzip_file = gzip.GzipFile
+        try:
+            from isal import igzip, isal_zlib
+            if compression_level <= isal_zlib.ISAL_BEST_COMPRESSION:
+                gzip_file = igzip.IGzipFile
+        except ImportError:
+            pass
+        raw = gzip_file(file_path, mode='wb', compresslevel=compression_level, mtime=0)
+        return io.TextIOWrapper(raw, encoding='utf-8', newline='')
 
     def stream_sql_to_csv(self,
                           file_path,
@@ -331,37 +408,39 @@ class StreamingDataExtractor(DataExtractor):
                           allow_nulls: bool = True,
                           chunk_size: int = 100000,
                           compress_using_gzip: bool = False,
-                          minimise: bool = False
+                          minimise: bool = False,
+                          compression_level: int = 1
                           ):
         """
         Write From SQL to CSV using streaming. No data is held in memory
         apart from chunks of rows as they are read.
         Optionally, data can be validated as it is read.
+        When compressing, the gzip level defaults to 1, which is several times
+        faster than the zlib default of 9 for a slightly larger file.
         """
         self.__build_query__()
         logger.info("Executing query")
-        connection = self.get_connection()
-
-        if compress_using_gzip:
-            compression_options = dict(method='gzip')
-            file_path = file_path + '.gz'
-        else:
-            compression_options = None
-
-        mode = 'w'
-        header = True
-        for df in pd.read_sql(self._query[0], connection, chunksize=chunk_size):
-            if validate or minimise:
-                self._data = df
-                if validate:
-                    self.validate_data(allow_nulls=allow_nulls)
-                if minimise:
-                    self.__minimise_data__()
-                    df = self._data
-            df.to_csv(file_path, mode=mode, header=header, index=False, compression=compression_options)
-            if header:
-                header = False
-                mode = "a"
+        with self.get_connection() as connection:
+            if compress_using_gzip:
+                file_path = file_path + '.gz'
+                output = self.__open_gzip__(file_path, compression_level)
+            else:
+                output = open(file_path, 'w', encoding='utf-8', newline='')
+
+            # Keep one handle open for the whole stream, so a compressed file
+            # is a single gzip member rather than one per chunk
+            with output:
+                header = True
+                for df in pd.read_sql(self._query[0], connection, chunksize=chunk_size):
+                    if validate or minimise:
+                        self._data = df
+                        if validate:
+                            self.validate_data(allow_nulls=allow_nulls)
+                        if minimise:
+                            self.__minimise_data__()
+                            df = self._data
+                    df.to_csv(output, header=header, index=False)
+                    header = False
 
         return file_path
 
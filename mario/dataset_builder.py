@@ -56,13 +56,17 @@ class DatasetBuilder:
         only one item.
         :return: None
         """
-        for hierarchy in self.metadata.get_hierarchies():
-            items = self.metadata.get_hierarchy(hierarchy)
-            items = [item for item in items if item in self.dataset_specification.items]
+        dataset_items = set(self.dataset_specification.items)
+        redundant = set()
+        for hierarchy, items in self.metadata.get_hierarchy_map().items():
+            items = [item for item in items if item in dataset_items]
             if len(items) == 1:
-                for item in self.metadata.items:
-                    if 'hierarchies' in item.properties:
-                        item.set_property('hierarchies',  [h for h in item.get_property('hierarchies') if h['hierarchy'] != hierarchy])
+                redundant.add(hierarchy)
+
+        if redundant:
+            for item in self.metadata.items:
+                if 'hierarchies' in item.properties:
+                    item.set_property('hierarchies', [h for h in item.get_property('hierarchies') if h['hierarchy'] not in redundant])
 
     def build(self, output_format: Format, file_path: str, template_path: str = None):
         if output_format == Format.TABLEAU_PACKAGED_DATASOURCE:
@@ -138,4 +142,5 @@ class DatasetBuilder:
                 schema_name=table_schema['schema'],
                 use_metadata_groups=True
             )
-            shutil.copyfile(src=output_path + '.tdsx', dst=file_path)
+            # The build is discarded with the temp folder, so move it rather than copy
+            shutil.move(src=output_path + '.tdsx', dst=file_path)
@@ -163,7 +163,7 @@ def dataset_from_excel(file_path: str):
 
     # Load sheet
     workbook = load_workbook(filename=file_path, read_only=True)
-    sheet: Worksheet = workbook.get_sheet_by_name('InputTemplate')
+    sheet: Worksheet = workbook['InputTemplate']
 
     # Read general spec values
     dataset_specification.name = sheet['C2'].value
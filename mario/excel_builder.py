@@ -53,12 +53,14 @@ class ExcelBuilder(object):
         Creates a write-only workbook and builds
         content in streaming mode to conserve memory
         """
+        # Fill in the notes before the template is first saved, and update the
+        # pivot in the same append as the data, so the workbook is only
+        # loaded and saved twice rather than once per page
         template_workbook = load_workbook(self.template)
+        self.__update_notes__(template_workbook['Notes'])
         template_workbook.save(self.filepath)
 
-        self.__create_notes_page__()
         self.__create_data_page__()
-        self.__create_pivot_page__()
         logger.debug("Completed workbook")
 
     def __format_cell__(self, cell, new_cell):
@@ -93,29 +95,21 @@ class ExcelBuilder(object):
             value = 'Excel pivot table'
         return value
 
-    def __create_notes_page__(self):
-        workbook = load_workbook(self.filepath)
-        notes = workbook.get_sheet_by_name('Notes')
-        self.__update_notes__(notes)
-        workbook.save(self.filepath)
-
-    def __create_pivot_page__(self):
-        workbook = load_workbook(self.filepath)
+    def __create_pivot_page__(self, workbook):
         pivot = workbook['Pivot']._pivots[0]
         # Update the pivot table range
         pivot.cache.cacheSource.worksheetSource.ref = self.__range__()
         # Set to refresh
         pivot.cache.refreshOnLoad = True
-        workbook.save(self.filepath)
 
     def create_notes_only(self, filename=None, data_format='CSV'):
         """
         Create a Notes page only, to accompany CSV outputs
         """
         self.workbook = load_workbook(self.template)
-        self.__update_notes__(data_format=data_format, ws=self.workbook.get_sheet_by_name('Notes'))
-        self.workbook.remove(self.workbook.get_sheet_by_name('Data'))
-        self.workbook.remove(self.workbook.get_sheet_by_name('Pivot'))
+        self.__update_notes__(data_format=data_format, ws=self.workbook['Notes'])
+        self.workbook.remove(self.workbook['Data'])
+        self.workbook.remove(self.workbook['Pivot'])
         if filename is not None:
             self.workbook.save(filename=filename)
         else:
@@ -139,6 +133,7 @@ class ExcelBuilder(object):
                 if_sheet_exists='replace'
         ) as writer:
             df.to_excel(excel_writer=writer, sheet_name='Data', index=False)
+            self.__create_pivot_page__(writer.book)
 
     def __update_notes__(self, ws, data_format='Excel pivot table'):
         """
@@ -1,5 +1,6 @@
 import json
-from typing import List
+import os
+from typing import Dict, List, TextIO, Union
 from mario.base import MarioBase
 
 
@@ -41,22 +42,40 @@ class Metadata(Item):
     def __init__(self, name: str = None):
         super().__init__()
         self._items: List[Item] = []
+        self._index: Dict[str, Item] = {}
         self.name = name
         if self.name is None:
             self.name = 'Metadata'
 
     def get_metadata(self, name: str):
+        item = self._index.get(name)
+        if item is not None and item.name == name:
+            return item
+        # Items can be renamed after they are added, so fall back to
+        # scanning them, and rebuild the index if the name turns up
         for item in self._items:
             if item.name == name:
+                self.__reindex__()
                 return item
         return None
 
+    def __reindex__(self) -> None:
+        self._index = {}
+        for item in self._items:
+            # Keep the first item with a given name
+            self._index.setdefault(item.name, item)
+
     @property
     def items(self):
         return self._items
 
     def add_item(self, item: Item) -> None:
         self._items.append(item)
+        self._index.setdefault(item.name, item)
+
+    def remove_item(self, item: Item) -> None:
+        self._items.remove(item)
+        self.__reindex__()
 
     def merge_items(self, metadata) -> None:
         for item in metadata.items:
@@ -86,7 +105,23 @@ class Metadata(Item):
         item_names_in_order = [item['name'] for item in sorted_items]
         return item_names_in_order
 
-    def save(self, file_path: str = None) -> None:
+    def get_hierarchy_map(self):
+        """ Returns a dict of each hierarchy name to its ordered list of item names, in a single pass over the items """
+        levels = {}
+        for item in self.items:
+            if item.get_property('hierarchies') is not None:
+                for hierarchy in item.get_property('hierarchies'):
+                    levels.setdefault(hierarchy['hierarchy'], []).append((hierarchy['level'], item.name))
+        return {
+            name: [item_name for level, item_name in sorted(items, key=lambda x: x[0])]
+            for name, items in levels.items()
+        }
+
+    def save(self, file_path: Union[str, os.PathLike, TextIO] = None) -> None:
+        """
+        Saves the metadata as JSON
+        :param file_path: the path to write to, or an open text file
+        """
         json_representation = {
             "collection": {
                 "name": self.name,
@@ -99,16 +134,23 @@ class Metadata(Item):
         for item in self._items:
             json_representation['collection']['items'].append(item.to_json())
 
+        if hasattr(file_path, 'write'):
+            json.dump(json_representation, file_path, default=vars)
+            return
+
         with open(file_path, mode='w', encoding='utf-8') as file:
             json.dump(json_representation, file, default=vars)
 
 
-def metadata_from_json(file_path: str = None) -> Metadata:
-    """ Factory method for creating a Metadata instance from a JSON file"""
+def metadata_from_json(file_path: Union[str, os.PathLike, TextIO] = None) -> Metadata:
+    """ Factory method for creating a Metadata instance from a JSON file, given its path or an open text file"""
     metadata = Metadata()
 
-    with open(file_path, encoding='utf-8') as metadata_file:
-        metadata_json = json.load(metadata_file)
+    if hasattr(file_path, 'read'):
+        metadata_json = json.load(file_path)
+    else:
+        with open(file_path, encoding='utf-8') as metadata_file:
+            metadata_json = json.load(metadata_file)
 
     if 'collection' in metadata_json:
         collection = metadata_json['collection']
@@ -174,22 +216,24 @@ def metadata_from_excel(
     """ Factory method for creating a Metadata instance from an Excel file"""
     import pandas as pd
     import re
-    pick_list = pd.read_excel(open(file_path, 'rb'), sheet_name=sheet_name, skiprows=1, header=0)
-    pick_list.reset_index()
+    # pandas opens the workbook read-only and values-only with openpyxl; passing the
+    # path rather than an open file lets it close the workbook when it is done
+    pick_list = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=1, header=0)
     pick_list.fillna('', inplace=True)
     pick_list.dropna(how='all', axis=1, inplace=True)
 
     metadata = Metadata()
     metadata.name = name
     metadata.set_property('source', file_path)
-    for index, row in pick_list.iterrows():
+    pattern = re.compile("\\(([^)]*)\\)")
+    # Plain dicts per row, rather than building a Series for each row with iterrows
+    for row in pick_list.to_dict(orient='records'):
         if isinstance(row[field_name_column], str):
             data_item = Item()
             data_item.name = row[field_name_column]
-            for key, value in row.to_dict().items():
+            for key, value in row.items():
                 data_item.set_property(key, value)
             # Domain splits
-            pattern = re.compile("\\(([^)]*)\\)")
             found = re.findall(pattern, data_item.name)
             if found:
                 domain = [x.strip() for x in found[0].split('/')]
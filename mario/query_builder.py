@@ -26,7 +26,7 @@ class QueryBuilder:
     def create_query(self) -> [str, List[any]]:
         raise NotImplementedError
 
-    def create_totals_query(self, measure=None) -> [str, List[any]]:
+    def create_totals_query(self, measure=None, measures=None) -> [str, List[any]]:
         raise NotImplementedError
 
 
@@ -44,17 +44,34 @@ class ViewBasedQueryBuilder(QueryBuilder):
             metadata=metadata
         )
 
-    def create_totals_query(self, measure=None) -> [str, List[any]]:
-        if measure is None:
-            _sql = f'SELECT COUNT(*) FROM "' + self.configuration.schema + '"."' + self.configuration.view + '"'
+    def create_totals_query(self, measure=None, measures=None) -> [str, List[any]]:
+        source = '"' + self.configuration.schema + '"."' + self.configuration.view + '"'
+        if self.configuration.row_limit is not None:
+            # Total the same rows that create_query returns, not the whole view
+            source = '(' + self.create_query()[0] + ') AS "limited"'
+        if measures is not None:
+            _sql = 'SELECT ' + ', '.join('SUM("' + measure + '")' for measure in measures) + ' FROM ' + source
+        elif measure is None:
+            _sql = 'SELECT COUNT(*) FROM ' + source
         else:
-            _sql = f'SELECT SUM("'+measure+'") FROM "' + self.configuration.schema + '"."' + self.configuration.view + '"'
+            _sql = 'SELECT SUM("' + measure + '") FROM ' + source
 
         _params = []
         return [_sql, _params]
 
     def create_query(self) -> [str, List[any]]:
         _sql = 'SELECT * FROM "' + self.configuration.schema + '"."' + self.configuration.view + '"'
+        if self.configuration.row_limit is not None:
+            # Order the rows so that the limit, and so create_totals_query, always picks the same ones.
+            # Only Postgres-style LIMIT is supported, as for the parameters in SubsetQueryBuilder
+            order_fields = [
+                '"' + item + '"' for item in self.dataset_specification.items
+                if self.metadata.get_metadata(item) is None
+                or not self.metadata.get_metadata(item).get_property('formula')
+            ]
+            if len(order_fields) > 0:
+                _sql += ' ORDER BY ' + ','.join(order_fields)
+            _sql += ' LIMIT ' + str(int(self.configuration.row_limit))
         _params = []
         return [_sql, _params]
 
@@ -85,26 +102,37 @@ class SubsetQueryBuilder(QueryBuilder):
                     return True
         return False
 
-    def create_totals_query(self, measure=None) -> [str, List[any]]:
+    def __get_measure_alias__(self, measure) -> str:
+        """ Decide column name based on whether 'subject' fields are present """
+        if measure in ['FPE', 'FTE'] and not self.contains_subject():
+            return 'Count'
+        return measure
+
+    def create_totals_query(self, measure=None, measures=None) -> [str, List[any]]:
         """
         Constructs a 'total only' query by combining the selections and constraints.
+        If the configuration has a row limit, the total is over the rows returned by
+        create_query rather than the whole view.
+        :param measure: the measure to total; defaults to all the measures in the specification
+        :param measures: a list of measures to total in the same query, one column each
         :return: an array containing the query prepared statement, and the parameters
         TODO make this more generic
         """
-        measures = []
-        if measure is None:
-            for measure in self.dataset_specification.measures:
-                # Decide column name based on whether 'subject' fields are present
-                if measure in ['FPE', 'FTE'] and not self.contains_subject():
-                    measures.append(fn.Sum(self.table[measure], 'Count'))
-                else:
-                    measures.append(fn.Sum(self.table[measure], measure))
+        if measures is not None:
+            aliases = {item: item for item in measures}
+        elif measure is None:
+            aliases = {item: self.__get_measure_alias__(item) for item in self.dataset_specification.measures}
         else:
-            measures.append(fn.Sum(self.table[measure], measure))
-
-        q = Query().from_(self.table).select(*measures)
+            aliases = {measure: measure}
 
-        q, parameters = self.create_constraints(q)
+        if self.configuration.row_limit is None:
+            measures = [fn.Sum(self.table[measure], alias) for measure, alias in aliases.items()]
+            q = Query().from_(self.table).select(*measures)
+            q, parameters = self.create_constraints(q)
+        else:
+            subquery, parameters = self.__build_query__()
+            measures = [fn.Sum(subquery[self.__get_measure_alias__(measure)], alias) for measure, alias in aliases.items()]
+            q = Query().from_(subquery).select(*measures)
         return [q.get_sql(), parameters]
 
     def create_query(self) -> [str, List[any]]:
@@ -112,6 +140,14 @@ class SubsetQueryBuilder(QueryBuilder):
         Constructs the query by combining the selections and constraints.
         :return: an array containing the query prepared statement, and the parameters
         """
+        q, parameters = self.__build_query__()
+        return [q.get_sql(), parameters]
+
+    def __build_query__(self):
+        """
+        Builds the query for create_query
+        :return: the Query object, and the parameters
+        """
 
         select_fields = []
         for field in self.dataset_specification.items:
@@ -127,11 +163,7 @@ class SubsetQueryBuilder(QueryBuilder):
             if measure in select_fields:
                 select_fields.remove(measure)
                 group_fields.remove(measure)
-                # Decide column name based on whether 'subject' fields are present
-                if measure in ['FPE', 'FTE'] and not self.contains_subject():
-                    measures.append(fn.Sum(self.table[measure], 'Count'))
-                else:
-                    measures.append(fn.Sum(self.table[measure], measure))
+                measures.append(fn.Sum(self.table[measure], self.__get_measure_alias__(measure)))
         select_fields.extend(measures)
 
         q = Query(). \
@@ -139,8 +171,12 @@ class SubsetQueryBuilder(QueryBuilder):
             select(*select_fields). \
             groupby(*group_fields)
 
-        q, parameters = self.create_constraints(q)
-        return [q.get_sql(), parameters]
+        if self.configuration.row_limit is not None:
+            # Order the groups so that the limit, and so create_totals_query, always picks the same ones.
+            # Only Postgres-style LIMIT is supported, as for the parameters in create_constraints
+            q = q.orderby(*group_fields).limit(self.configuration.row_limit)
+
+        return self.create_constraints(q)
 
     def create_constraints(self, q):
         """
@@ -154,14 +190,12 @@ class SubsetQueryBuilder(QueryBuilder):
         parameters = {}
         for constraint in self.dataset_specification.constraints:
             column = constraint.item
-            placeholders = []
-            for i in range(len(constraint.allowed_values)):
-                parameter_name = column.replace(" ", "_") + str(i)
-                # Postgres style.
-                # TODO Probably need some way of identifying which parameter style to apply.
-                parameter = Parameter('%('+parameter_name+')s')
-                placeholders.append(parameter)
-                parameters[parameter_name] = constraint.allowed_values[i]
+            prefix = column.replace(" ", "_")
+            parameter_names = [prefix + str(i) for i in range(len(constraint.allowed_values))]
+            # Postgres style.
+            # TODO Probably need some way of identifying which parameter style to apply.
+            placeholders = [Parameter('%(' + parameter_name + ')s') for parameter_name in parameter_names]
+            parameters.update(zip(parameter_names, constraint.allowed_values))
             clauses.append(self.table[column].isin(placeholders))
 
         q = q.where(Criterion.all(clauses))
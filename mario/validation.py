@@ -1,4 +1,5 @@
 import logging
+from contextlib import contextmanager
 from enum import Enum
 
 from mario.data_extractor import Configuration
@@ -35,6 +36,10 @@ class Validator:
         self.metadata = metadata
         self.errors = []
         self.warnings = []
+        # Distinct values and (min, max) per column, shared by the checks
+        # and by repeated calls to validate_data
+        self._column_values = {}
+        self._column_ranges = {}
 
     def __get_column_name__(self, item: Item):
         """ Returns the column name for a metadata item"""
@@ -57,9 +62,23 @@ class Validator:
         """ Returns the minimum value of an item from the data """
         raise NotImplementedError()
 
+    def __get_distinct_values__(self, item: Item):
+        """ Returns the unique values in the data for an item, reading them only once per column """
+        column = self.__get_column_name__(item)
+        if column not in self._column_values:
+            self._column_values[column] = self.__get_column_values__(item)
+        return self._column_values[column]
+
+    def __get_range__(self, item: Item):
+        """ Returns the minimum and maximum values for an item, reading them only once per column """
+        column = self.__get_column_name__(item)
+        if column not in self._column_ranges:
+            self._column_ranges[column] = self.__get_minimum_maximum_values__(item)
+        return self._column_ranges[column]
+
     def __contains_nulls__(self, item: Item):
         """ Returns True if the item has any Null values in the data """
-        return None in self.__get_column_values__(item)
+        return None in self.__get_distinct_values__(item)
 
     def __get_data_for_hierarchy__(self, name):
         """ Returns the dataframe for a hierarchy """
@@ -83,10 +102,10 @@ class Validator:
         # Group by all levels except the last one
         grouped = df.groupby(levels[:-1])[levels[-1]].apply(list).reset_index()
 
-        # Check for duplicates at the last level
-        for _, row in grouped.iterrows():
-            higher_levels = tuple(row[levels[:-1]])
-            values = row[levels[-1]]
+        # Check for duplicates at the last level. Zip the columns rather than
+        # using iterrows, which builds a Series for every group
+        higher_level_columns = zip(*(grouped[level] for level in levels[:-1]))
+        for higher_levels, values in zip(higher_level_columns, grouped[levels[-1]]):
             for value in values:
                 if value not in hierarchy:
                     hierarchy[value] = higher_levels
@@ -170,13 +189,17 @@ class Validator:
     def check_domain(self, item: Item):
         """ Checks that the values for an item conform to the domain in its specification """
         if item.get_property('domain') is not None:
-            data_domain = self.__get_column_values__(item)
+            data_domain = self.__get_distinct_values__(item)
             metadata_domain = item.get_property('domain')
+            # Look up membership in sets, but iterate the lists so the
+            # messages come out in the same order as the data and metadata
+            data_domain_set = set(data_domain)
+            metadata_domain_set = set(metadata_domain)
             for element in data_domain:
-                if element not in metadata_domain:
+                if element not in metadata_domain_set:
                     self.errors.append(f"Validation error: '{str(element)}' is not in domain of '{item.name}'")
             for metadata_element in metadata_domain:
-                if metadata_element not in data_domain:
+                if metadata_element not in data_domain_set:
                     self.warnings.append(f"Validation warning: '{str(metadata_element)}' is in domain of '{item.name}' but not present in the data")
 
     def check_range(self, item: Item):
@@ -184,7 +207,7 @@ class Validator:
         if item.get_property('range') is not None:
             min_value = item.get_property('range')[0]
             max_value = item.get_property('range')[1]
-            data_min, data_max = self.__get_minimum_maximum_values__(item)
+            data_min, data_max = self.__get_range__(item)
             if data_min < min_value:
                 self.errors.append(f"Validation error: '{item.name}': '{str(data_min)}' is less than '{str(min_value)}'")
             if data_max > max_value:
@@ -194,12 +217,12 @@ class Validator:
         """ Checks that the values for an item match the pattern in the specification """
         import re
         if item.get_property('pattern') is not None:
-            values = self.__get_column_values__(item)
+            values = self.__get_distinct_values__(item)
             pattern = re.compile(item.get_property('pattern'))
+            # The values are already distinct, so each is matched only once
             for value in values:
-                if value is not None:
-                    if not re.match(pattern, str(value)):
-                        self.errors.append(f"Validation error: '{item.name}': '{str(value)}' does not match the pattern '{str(item.get_property('pattern'))}'")
+                if value is not None and not pattern.match(str(value)):
+                    self.errors.append(f"Validation error: '{item.name}': '{str(value)}' does not match the pattern '{pattern.pattern}'")
 
     def check_quality_checks(self, item: Item):
         """ Checks whether an item has any quality rules used in validation """
@@ -281,6 +304,10 @@ class DataFrameValidator(Validator):
         values = self.data[column].replace({pd.NA: None}).unique()
         return list(values)
 
+    def __contains_nulls__(self, item: Item):
+        column = self.__get_column_name__(item)
+        return self.data[column].isna().values.any()
+
     def __get_minimum_maximum_values__(self, item:Item):
         column = self.__get_column_name__(item)
         data_min = self.data[column].min()
@@ -322,6 +349,50 @@ class HyperValidator(Validator):
         table_schema = get_default_table_and_schema(self.hyper_file_path)
         self.table = table_schema['table']
         self.schema = table_schema['schema']
+        self._table_definition = None
+        self._connection = None
+
+    @contextmanager
+    def __connect__(self):
+        """
+        Opens a connection to the hyper file. Inside __hold_connection__ this
+        reuses its connection, so the checks don't start a Hyper process each
+        """
+        if self._connection is not None:
+            yield self._connection
+            return
+        from tableauhyperapi import HyperProcess, Telemetry, Connection
+        with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
+            with Connection(hyper.endpoint, self.hyper_file_path) as connection:
+                yield connection
+
+    @contextmanager
+    def __hold_connection__(self):
+        """ Keeps one connection open for all the checks run inside the block """
+        with self.__connect__() as connection:
+            previous = self._connection
+            self._connection = connection
+            try:
+                yield
+            finally:
+                self._connection = previous
+
+    def __get_table_definition__(self):
+        """ Returns the definition of the table, reading it from the hyper file on first use """
+        if self._table_definition is None:
+            from tableauhyperapi import TableName
+            with self.__connect__() as connection:
+                self._table_definition = connection.catalog.get_table_definition(TableName(self.schema, self.table))
+        return self._table_definition
+
+    def validate_data(self, allow_nulls=True, check_hierarchies=False, detect_anomalies=False, segmentation=None):
+        with self.__hold_connection__():
+            return super().validate_data(
+                allow_nulls=allow_nulls,
+                check_hierarchies=check_hierarchies,
+                detect_anomalies=detect_anomalies,
+                segmentation=segmentation
+            )
 
     def __get_data_for_hierarchy__(self, name):
         from pantab import frame_from_hyper_query
@@ -332,10 +403,8 @@ class HyperValidator(Validator):
                      FROM "{self.schema}"."{self.table}" 
                      GROUP BY {fields} 
         """
-        from tableauhyperapi import HyperProcess, Telemetry, Connection
-        with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
-            with Connection(hyper.endpoint, self.hyper_file_path) as connection:
-                results_df = frame_from_hyper_query(connection,query)
+        with self.__connect__() as connection:
+            results_df = frame_from_hyper_query(connection, query)
         return results_df
 
     def __get_column_with_segmentation__(self, item:Item, segmentation: str):
@@ -346,33 +415,24 @@ class HyperValidator(Validator):
                     FROM "{self.schema}"."{self.table}" 
                     GROUP BY "{segmentation}"
         """
-        from tableauhyperapi import HyperProcess, Telemetry, Connection
-        with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
-            with Connection(hyper.endpoint, self.hyper_file_path) as connection:
-                results_df = frame_from_hyper_query(connection,query)
+        with self.__connect__() as connection:
+            results_df = frame_from_hyper_query(connection, query)
         return results_df
 
     def check_column_present(self, item: Item):
         column = self.__get_column_name__(item)
-        from tableau_builder.hyper_utils import check_column_exists
         if item.get_property('formula') is None:
-            if not check_column_exists(
-                    hyper_path=self.hyper_file_path,
-                    column_name=column,
-                    table_name=self.table,
-                    schema_name=self.schema
-            ):
+            columns = [c.name.unescaped for c in self.__get_table_definition__().columns]
+            if column not in columns:
                 self.errors.append(f"Validation error: '{item.name}' in specification is missing from dataset")
                 return False
             return True
         return False
 
     def __get_column_data_type__(self, item: Item):
-        from tableau_builder.hyper_utils import get_table
         from tableauhyperapi import TypeTag
         column = self.__get_column_name__(item)
-        table = get_table(hyper_path=self.hyper_file_path, table_name=self.table, schema_name=self.schema)
-        datatype = table.get_column_by_name(column).type.tag
+        datatype = self.__get_table_definition__().get_column_by_name(column).type.tag
         if datatype in [TypeTag.TEXT, TypeTag.CHAR]:
             return DataTypes.TEXT
         if datatype in [TypeTag.BIG_INT, TypeTag.INT, TypeTag.SMALL_INT]:
@@ -386,27 +446,19 @@ class HyperValidator(Validator):
         return str(datatype)
 
     def __get_minimum_maximum_values__(self, item):
-        from tableauhyperapi import HyperProcess, Telemetry, Connection
         column = self.__get_column_name__(item)
-        with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
-            with Connection(hyper.endpoint, self.hyper_file_path) as connection:
-                with connection.execute_query(
-                        'SELECT MIN("' + column + '") FROM "' + self.schema + '"."' + self.table + '"') as result:
-                    min_data = [item for row in list(result) for item in row][0]
-                with connection.execute_query(
-                        'SELECT MAX("' + column + '") FROM "' + self.schema + '"."' + self.table + '"') as result:
-                    max_data = [item for row in list(result) for item in row][0]
+        with self.__connect__() as connection:
+            min_data, max_data = connection.execute_list_query(
+                f'SELECT MIN("{column}"), MAX("{column}") FROM "{self.schema}"."{self.table}"')[0]
         return min_data, max_data
 
     def __get_column_values__(self, item: Item):
-        from tableauhyperapi import HyperProcess, Telemetry, Connection
         column = self.__get_column_name__(item)
-        with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
-            with Connection(hyper.endpoint, self.hyper_file_path) as connection:
-                with connection.execute_query(
-                        'SELECT DISTINCT "' + column + '" FROM "' + self.schema + '"."' + self.table + '"') as result:
-                    rows = list(result)
-                    hyper_domain = [item for row in rows for item in row]
+        with self.__connect__() as connection:
+            with connection.execute_query(
+                    'SELECT DISTINCT "' + column + '" FROM "' + self.schema + '"."' + self.table + '"') as result:
+                rows = list(result)
+                hyper_domain = [item for row in rows for item in row]
         return hyper_domain
 
 
@@ -0,0 +1 @@
+SELECT "Academic year","Continuation status",SUM("FPE") "Count" FROM "dbo"."v_student_fpe" WHERE "Sex" IN (%(Sex0)s) AND "Onward use category 1" IN (%(Onward_use_category_10)s) AND "Academic year start" IN (%(Academic_year_start0)s,%(Academic_year_start1)s) GROUP BY "Academic year","Continuation status"
\ No newline at end of file
@@ -0,0 +1 @@
+SELECT "Ship Mode","Ship Date","Country/Region","Region","State/Province","City","Postal Code","Category","Product Name",SUM("Sales") "Sales",SUM("Profit") "Profit",SUM("Discount") "Discount" FROM "dbo"."v_student_fpe" GROUP BY "Ship Mode","Ship Date","Country/Region","Region","State/Province","City","Postal Code","Category","Product Name"
\ No newline at end of file
@@ -0,0 +1 @@
+SELECT * FROM "dbo"."v_student_fpe"
\ No newline at end of file
@@ -24,6 +24,7 @@ setup(
     ],
     extras_require={
         'Airflow': ['apache-airflow-providers-common-sql'],
-        'Tableau': ['pantab', 'tableauhyperapi', 'tableau-builder==0.18']
+        'Tableau': ['pantab', 'tableauhyperapi', 'tableau-builder==0.18'],
+        'Compression': ['isal']
     }
 )
\ No newline at end of file
@@ -0,0 +1,164 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from mario.dataset_specification import dataset_from_json, dataset_from_manifest
+from mario.metadata import metadata_from_json, metadata_from_manifest
+
+from test.helpers import TEST_DIR
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', default=False,
+                     help='run the slow tests that stream the whole superstore view')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: streams the whole superstore view; only runs with --run-slow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip_slow = pytest.mark.skip(reason='Skipping slow test; use --run-slow to run it')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(scope='session')
+def base_dataset():
+    """
+    The dataset specification in test/dataset.json, parsed once per session
+    for tests that only read it. Tests that modify it should use dataset.
+    """
+    return dataset_from_json(TEST_DIR / 'dataset.json')
+
+
+@pytest.fixture(scope='session')
+def base_metadata():
+    """
+    The metadata in test/metadata.json, parsed once per session for tests
+    that only read it. Tests that modify it should use metadata.
+    """
+    return metadata_from_json(TEST_DIR / 'metadata.json')
+
+
+# The per-test fixtures parse the file again rather than deep copying the
+# session object, as for these small files parsing is the cheaper of the two
+
+@pytest.fixture
+def dataset():
+    """
+    A fresh copy of test/dataset.json that the test is free to modify
+    """
+    return dataset_from_json(TEST_DIR / 'dataset.json')
+
+
+@pytest.fixture
+def metadata():
+    """
+    A fresh copy of test/metadata.json that the test is free to modify
+    """
+    return metadata_from_json(TEST_DIR / 'metadata.json')
+
+
+@pytest.fixture
+def manifest_dataset():
+    """
+    The dataset specification in test/manifest_superstore.json, free to modify
+    """
+    return dataset_from_manifest(TEST_DIR / 'manifest_superstore.json')
+
+
+@pytest.fixture
+def manifest_metadata():
+    """
+    The metadata in test/manifest_superstore.json, free to modify
+    """
+    return metadata_from_manifest(TEST_DIR / 'manifest_superstore.json')
+
+
+@pytest.fixture(scope='session')
+def orders_csv():
+    """
+    Path to test/orders.csv
+    """
+    return str(TEST_DIR / 'orders.csv')
+
+
+@pytest.fixture(scope='session')
+def orders_df():
+    """
+    The contents of test/orders.csv, read once per session. Pass a copy
+    to anything that may modify the frame.
+    """
+    return pd.read_csv(TEST_DIR / 'orders.csv')
+
+
+def copy_to_tmp(tmp_path_factory, filename) -> str:
+    destination = tmp_path_factory.mktemp('hyper') / filename
+    shutil.copyfile(TEST_DIR / filename, destination)
+    return str(destination)
+
+
+@pytest.fixture(scope='session')
+def orders_hyper(tmp_path_factory):
+    """
+    Path to a copy of test/orders.hyper, made once per session under the
+    pytest base temp directory (which can be put on tmpfs with --basetemp).
+    Working on a copy also keeps the committed file from being modified.
+    Tests must treat it as read-only.
+    """
+    return copy_to_tmp(tmp_path_factory, 'orders.hyper')
+
+
+@pytest.fixture(scope='session')
+def orders_with_nulls_hyper(tmp_path_factory):
+    """
+    Path to a copy of test/orders_with_nulls.hyper, as for orders_hyper
+    """
+    return copy_to_tmp(tmp_path_factory, 'orders_with_nulls.hyper')
+
+
+@pytest.fixture(scope='session')
+def orders_hyper_df(orders_hyper):
+    """
+    The contents of test/orders.hyper, read once per session. Pass a copy
+    to anything that may modify the frame.
+    """
+    import pantab
+    from tableauhyperapi import TableName
+    return pantab.frame_from_hyper(source=orders_hyper, table=TableName('Extract', 'Extract'))
+
+
+@pytest.fixture(scope='session')
+def orders_with_nulls_hyper_df(orders_with_nulls_hyper):
+    """
+    The contents of test/orders_with_nulls.hyper, as for orders_hyper_df
+    """
+    import pantab
+    from tableauhyperapi import TableName
+    return pantab.frame_from_hyper(source=orders_with_nulls_hyper, table=TableName('Extract', 'Extract'))
+
+
+@pytest.fixture(scope='session')
+def segmentation_hyper(base_dataset, base_metadata, orders_hyper_df, tmp_path_factory):
+    """
+    Path to a hyper file of the orders data in the dataset specification
+    with a 'Year' segmentation column added, written once per session.
+    Tests must treat it as read-only.
+    """
+    from mario.data_extractor import DataFrameExtractor
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_hyper_df.copy(deep=False)
+    )
+    df = extractor.get_data_frame()
+    df['Year'] = df['Ship Date'].astype(str).str[0:4]
+
+    file_path = str(tmp_path_factory.mktemp('hyper') / 'orders_with_segmentation.hyper')
+    extractor.save_data_as_hyper(file_path=file_path, minimise=False)
+    return file_path
@@ -0,0 +1,43 @@
+import csv
+from pathlib import Path
+
+try:
+    # ISA-L's igzip is a faster drop-in replacement for gzip, where installed
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+
+TEST_DIR = Path(__file__).parent
+
+
+def csv_row_count(file_path) -> int:
+    """
+    Counts the data rows in a CSV file, excluding the header, without
+    parsing or decoding it. Files ending in .gz are decompressed as they
+    are read. Assumes no field contains an embedded newline.
+    :param file_path: the CSV file
+    :return: the number of data rows
+    """
+    opener = gzip.open if str(file_path).endswith('.gz') else open
+    lines = 0
+    last = b'\n'
+    with opener(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    # The last row may not end with a newline
+    if last != b'\n':
+        lines += 1
+    return lines - 1
+
+
+def csv_columns(file_path) -> list:
+    """
+    Reads just the header row of a CSV file
+    :param file_path: the CSV file
+    :return: the list of column names
+    """
+    opener = gzip.open if str(file_path).endswith('.gz') else open
+    with opener(file_path, 'rt', encoding='utf-8-sig', newline='') as file:
+        return next(csv.reader(file), [])
+
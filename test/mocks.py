@@ -17,3 +17,20 @@ class MockQueryBuilder(QueryBuilder):
 
     def create_query(self) -> [str, List[any]]:
         return [self.sql, []]
+
+
+class MockTableQueryBuilder(QueryBuilder):
+    """
+    Selects every row of a 'superstore' table, e.g. one loaded from
+    orders.csv into a local SQLite database
+    """
+
+    def __init__(self,
+                 configuration: Configuration,
+                 metadata: Metadata,
+                 dataset_specification: DatasetSpecification
+                 ):
+        self.sql = 'SELECT * FROM superstore'
+
+    def create_query(self) -> [str, List[any]]:
+        return [self.sql, []]
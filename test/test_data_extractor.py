@@ -1,280 +1,263 @@
+import copy
 import os
-import shutil
-import tempfile
 import logging
 
 import pandas as pd
 import pytest
 
+try:
+    from tableauhyperapi import HyperProcess, Telemetry, Connection
+except ImportError:
+    HyperProcess = None
+
 from mario.data_extractor import DataExtractor, Configuration, StreamingDataExtractor, DataFrameExtractor
-from mario.dataset_specification import dataset_from_json
-from mario.metadata import metadata_from_json
 from mario.query_builder import ViewBasedQueryBuilder, SubsetQueryBuilder
 
-from test.mocks import MockQueryBuilder
+from test.helpers import csv_row_count, csv_columns
+from test.mocks import MockQueryBuilder, MockTableQueryBuilder
 
 logger = logging.getLogger(__name__)
 
+CONNECTION_STRING = os.environ.get('CONNECTION_STRING')
+requires_sql = pytest.mark.skipif(not CONNECTION_STRING,
+                                  reason="Skipping SQL test as no database configured")
+requires_bcp = pytest.mark.skipif(not os.environ.get('BCP'), reason='BCP not available')
+requires_hyper = pytest.mark.skipif(HyperProcess is None, reason='tableauhyperapi not installed')
 
-def test_csv_to_csv():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.csv')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-    extractor.validate_data()
-    with tempfile.NamedTemporaryFile(suffix='.csv') as file:
-        file.close()
-        extractor.save_data_as_csv(file_path=file.name)
+# Chunk size for tests that stream the whole view. The row-limited tests keep
+# a small chunk size so that they still write more than one chunk.
+CHUNK_SIZE = int(os.environ.get('MARIO_TEST_CHUNK', 65536))
 
 
-def test_csv_to_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@pytest.fixture(scope='module')
+def sql_view_extractor(base_dataset, base_metadata):
+    """
+    A streaming extractor over the first 100 rows of the superstore view, shared
+    by the tests that only stream it to a file without validating or minimising
+    """
     configuration = Configuration(
-        file_path=os.path.join('test', 'orders.csv')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-    with tempfile.NamedTemporaryFile(suffix='.hyper') as file:
-        file.close()
-        extractor.save_data_as_hyper(file_path=file.name)
-
-
-def test_hyper_with_nulls_to_csv():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders_with_nulls.hyper')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-    with pytest.raises(ValueError):
-        extractor.validate_data(allow_nulls=False)
-    with tempfile.NamedTemporaryFile(suffix='.csv') as file:
-        file.close()
-        extractor.save_data_as_csv(file_path=file.name)
-
-
-def test_hyper_without_nulls_to_csv():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.hyper')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-    extractor.validate_data(allow_nulls=False)
-    with tempfile.NamedTemporaryFile(suffix='.csv') as file:
-        file.close()
-        extractor.save_data_as_csv(file_path=file.name)
-
-
-def test_stream_sql_to_csv():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
-    extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+    return StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    extractor.stream_sql_to_csv(file_path=file.name, chunk_size=1000)
-    df = pd.read_csv(file)
-    assert len(df) == 10194
 
 
-def test_stream_sql_to_csv_with_compression():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
+@pytest.fixture(scope='module')
+def sql_view_csv(sql_view_extractor, tmp_path_factory):
+    """
+    The CSV streamed from sql_view_extractor, written once per module for
+    the tests that only inspect the output
+    """
+    file_path = str(tmp_path_factory.mktemp('sql_view') / 'data.csv')
+    sql_view_extractor.stream_sql_to_csv(file_path=file_path, chunk_size=40)
+    return file_path
+
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@pytest.fixture(scope='session')
+def superstore_csv(base_dataset, base_metadata, tmp_path_factory):
+    """
+    The whole superstore view streamed to CSV, written once per session
+    for the tests that only inspect the output
+    """
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
         query_builder=ViewBasedQueryBuilder
     )
     extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    gzip_path = extractor.stream_sql_to_csv(file_path=file.name, chunk_size=1000, compress_using_gzip=True)
-    df = pd.read_csv(gzip_path)
-    assert len(df) == 10194
+    file_path = str(tmp_path_factory.mktemp('superstore') / 'data.csv')
+    extractor.stream_sql_to_csv(file_path=file_path, chunk_size=CHUNK_SIZE)
+    return file_path
 
 
-def test_stream_sql_to_hyper():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@pytest.mark.parametrize('source, output, validate, allow_nulls, expect_error', [
+    ('orders_csv', 'data.csv', True, True, False),
+    ('orders_csv', 'data.hyper', False, True, False),
+    ('orders_with_nulls_hyper', 'data.csv', True, False, True),
+    ('orders_hyper', 'data.csv', True, False, False),
+], ids=['csv_to_csv', 'csv_to_hyper', 'hyper_with_nulls_to_csv', 'hyper_without_nulls_to_csv'])
+def test_save_data(base_dataset, base_metadata, tmp_path, request, source, output, validate, allow_nulls, expect_error):
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
-        schema="dev",
-        view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        file_path=request.getfixturevalue(source)
     )
-    extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+    extractor = DataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
         configuration=configuration
     )
-    folder = tempfile.TemporaryDirectory()
-    file = os.path.join(folder.name, 'data.hyper')
-    extractor.stream_sql_to_hyper(file_path=file, chunk_size=1000)
-    import pantab
-    from tableauhyperapi import TableName
-    df = pantab.frame_from_hyper(source=file, table=TableName('Extract', 'Extract'))
-    assert len(df) == 10194
-    shutil.rmtree(folder.name)
-
-
-def test_stream_sql_to_csv_with_validation():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    # Restrict ship modes so that validation fails
-    metadata.get_metadata('Ship Mode').set_property('domain', ["First Class", "Second Class"])
+    if expect_error:
+        with pytest.raises(ValueError):
+            extractor.validate_data(allow_nulls=allow_nulls)
+    elif validate:
+        extractor.validate_data(allow_nulls=allow_nulls)
+    file_path = str(tmp_path / output)
+    if output.endswith('.hyper'):
+        extractor.save_data_as_hyper(file_path=file_path)
+    else:
+        extractor.save_data_as_csv(file_path=file_path)
+        assert csv_row_count(file_path) == 10194
+        assert 'Sales' in csv_columns(file_path)
+
+
+@requires_sql
+def test_stream_sql_to_csv(sql_view_csv):
+    assert csv_row_count(sql_view_csv) == 100
+
+
+@requires_sql
+def test_stream_sql_to_csv_keeps_all_columns(sql_view_csv, base_dataset):
+    # Without minimisation every column of the view is written
+    columns = csv_columns(sql_view_csv)
+    for dimension in base_dataset.dimensions:
+        assert dimension in columns
+
+
+@requires_sql
+def test_stream_sql_to_csv_with_compression(sql_view_extractor, tmp_path):
+    extractor = sql_view_extractor
+    gzip_path = extractor.stream_sql_to_csv(file_path=str(tmp_path / 'data.csv'), chunk_size=40, compress_using_gzip=True)
+    assert csv_row_count(gzip_path) == 100
+
+
+@requires_sql
+@requires_hyper
+def test_stream_sql_to_hyper(sql_view_extractor, tmp_path):
+    extractor = sql_view_extractor
+    file = str(tmp_path / 'data.hyper')
+    extractor.stream_sql_to_hyper(file_path=file, chunk_size=40)
+    with HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, 'test') as hyper:
+        with Connection(hyper.endpoint, file) as connection:
+            assert connection.execute_scalar_query('SELECT COUNT(*) FROM "Extract"."Extract"') == 100
+
+
+@requires_sql
+def test_stream_sql_to_csv_with_validation(base_dataset, metadata, tmp_path):
+    # Restrict ship modes so that validation fails. The limited rows are ordered by
+    # Ship Mode, so they start with 'First Class'
+    metadata.get_metadata('Ship Mode').set_property('domain', ["Second Class", "Standard Class"])
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
     extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
+        dataset_specification=base_dataset,
         metadata=metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
     with pytest.raises(ValueError):
-        extractor.stream_sql_to_csv(file_path=file.name, validate=True, chunk_size=1000)
-
+        extractor.stream_sql_to_csv(file_path=str(tmp_path / 'data.csv'), validate=True, chunk_size=1000)
 
-def test_stream_sql_to_csv_with_minimisation():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@requires_sql
+def test_stream_sql_to_csv_with_minimisation(dataset, base_metadata, tmp_path):
     # Remove ship mode
     dataset.dimensions.remove('Ship Mode')
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
     extractor = StreamingDataExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    extractor.stream_sql_to_csv(file_path=file.name, validate=False, minimise=True, chunk_size=1000)
-    df = pd.read_csv(file.name)
-    assert 'Ship Mode' not in df.columns
-
+    file_path = str(tmp_path / 'data.csv')
+    extractor.stream_sql_to_csv(file_path=file_path, validate=False, minimise=True, chunk_size=40)
+    columns = csv_columns(file_path)
+    assert 'Ship Mode' not in columns
 
-def test_column_mapping():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    # Rename 'region' to area
+@pytest.fixture(scope='module')
+def renamed_dataset(base_dataset):
+    """
+    The base dataset with 'Region' replaced by 'Area'
+    """
+    dataset = copy.deepcopy(base_dataset)
     dataset.dimensions.remove('Region')
     dataset.dimensions.append('Area')
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+    return dataset
+
+
+@pytest.fixture(scope='module')
+def renamed_metadata(base_metadata):
+    """
+    The base metadata with the 'Region' item renamed to 'Area', but
+    still output under its original name
+    """
+    metadata = copy.deepcopy(base_metadata)
     meta = metadata.get_metadata('Region')
     meta.name = 'Area'
     meta.set_property('output_name', 'Region')
-    assert metadata.get_metadata('Area') is not None
-    assert metadata.get_metadata('Region') is None
-    assert 'Area' in dataset.dimensions
-    assert 'Region' not in dataset.dimensions
+    return metadata
+
 
+def test_renamed_metadata(renamed_dataset, renamed_metadata):
+    assert renamed_metadata.get_metadata('Area') is not None
+    assert renamed_metadata.get_metadata('Region') is None
+    assert 'Area' in renamed_dataset.dimensions
+    assert 'Region' not in renamed_dataset.dimensions
+
+
+@requires_sql
+def test_column_mapping(renamed_dataset, renamed_metadata, tmp_path):
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
     extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+        dataset_specification=renamed_dataset,
+        metadata=renamed_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
+    file_path = str(tmp_path / 'data.csv')
     extractor.stream_sql_to_csv(
-        file_path=file.name,
+        file_path=file_path,
         validate=True,
-        chunk_size=1000
+        chunk_size=40
     )
-    df = pd.read_csv(file.name)
-    assert 'Region' in df.columns
+    columns = csv_columns(file_path)
+    assert 'Region' in columns
 
 
-def test_stream_to_csv_using_bcp():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-    if not os.environ.get('BCP'):
-        pytest.skip('BCP not available')
-    conn = os.environ.get('CONNECTION_STRING')
+@requires_sql
+@requires_bcp
+def test_stream_to_csv_using_bcp(base_dataset, base_metadata, tmp_path):
+    conn = CONNECTION_STRING
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     configuration = Configuration(
         connection_string=conn,
         schema='dbo',
         query_builder=MockQueryBuilder
     )
     extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    file.close()  # dumb Windows hack
     extractor.stream_sql_to_csv_using_bcp(
         table_name='v_mario_test',
-        output_file_path=file.name,
+        output_file_path=str(tmp_path / 'data.csv'),
         database_name=os.environ.get('DATABASE'),
         use_view=True,
         server_url=os.environ.get('SERVER'),
@@ -282,146 +265,149 @@ def test_stream_to_csv_using_bcp():
     )
 
 
-def test_hyper_totals():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.hyper')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
+def test_hyper_totals(base_dataset, base_metadata, orders_hyper_df):
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_hyper_df.copy(deep=False)
     )
     extractor.validate_data()
     assert extractor.get_total() == 2326534.3543
 
 
-def test_csv_totals():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.csv')
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
+@pytest.fixture(scope='module')
+def csv_extractor(base_dataset, base_metadata, orders_df):
+    """
+    An extractor over orders.csv, validated once and shared by the
+    tests that only read totals from it
+    """
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
     )
     extractor.validate_data()
-    assert extractor.get_total() == 2326534.3543
-    assert extractor.get_total(measure='Sales') == 2326534.3543
-    assert round(extractor.get_total(measure='Profit'), 4) == 292296.8146
+    return extractor
+
+
+@pytest.mark.parametrize('measure, expected', [
+    (None, 2326534.3543),
+    ('Sales', 2326534.3543),
+    ('Profit', 292296.8146),
+])
+def test_csv_total(csv_extractor, measure, expected):
+    assert round(csv_extractor.get_total(measure=measure), 4) == expected
+
+
+def test_csv_totals(csv_extractor):
+    totals = csv_extractor.get_totals(measures=['Sales', 'Profit'])
+    assert totals['Sales'] == 2326534.3543
+    assert round(totals['Profit'], 4) == 292296.8146
 
 
-def test_csv_total_profit():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+def test_csv_total_profit(dataset, base_metadata, orders_df):
     dataset.measures = ['Profit']
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.csv')
-    )
-    extractor = DataExtractor(
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
     )
     extractor.validate_data()
     assert round(extractor.get_total(), 4) == 292296.8146
 
 
-def test_csv_total_no_measures():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+def test_csv_total_no_measures(dataset, base_metadata, orders_df):
     dataset.measures = []
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(
-        file_path=os.path.join('test', 'orders.csv')
-    )
-    extractor = DataExtractor(
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
     )
     extractor.validate_data()
     assert extractor.get_total() == 10194
+    assert extractor.get_totals() == {}
     with pytest.raises(ValueError):
         extractor.get_total(measure='Sales')
+    with pytest.raises(ValueError):
+        extractor.get_totals(measures=['Sales'])
 
 
-def test_stream_sql_subset_to_csv_with_total():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
+def test_csv_row_count_before_loading(dataset, base_metadata, orders_csv):
+    dataset.measures = []
+    extractor = DataExtractor(
+        dataset_specification=dataset,
+        metadata=base_metadata,
+        configuration=Configuration(file_path=orders_csv)
+    )
+    assert extractor.get_total() == 10194
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+
+@requires_sql
+@pytest.mark.slow
+def test_stream_sql_subset_to_csv_with_total(dataset, base_metadata, tmp_path):
     dataset.measures = ['Sales', 'Profit']
     dataset.dimensions = ['Product Name']
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
         query_builder=SubsetQueryBuilder
     )
     extractor = StreamingDataExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    extractor.stream_sql_to_csv(file_path=file.name, chunk_size=1000)
-    df = pd.read_csv(file)
-    assert len(df) == 1849
-    assert round(extractor.get_total(), 4) == 2326534.3543
-    assert round(extractor.get_total(measure='Sales'), 4) == 2326534.3543
-    assert round(extractor.get_total(measure='Profit'), 4) == 292296.8146
+    file_path = str(tmp_path / 'data.csv')
+    extractor.stream_sql_to_csv(file_path=file_path, chunk_size=CHUNK_SIZE)
+    assert csv_row_count(file_path) == 1849
+    # Both totals come from one query
+    totals = extractor.get_totals()
+    assert round(totals['Sales'], 4) == 2326534.3543
+    assert round(totals['Profit'], 4) == 292296.8146
 
 
-def test_stream_sql_view_to_csv_with_total():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
+@requires_sql
+@pytest.mark.slow
+def test_stream_sql_view_to_csv(superstore_csv):
+    assert csv_row_count(superstore_csv) == 10194
 
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+
+@requires_sql
+@pytest.mark.slow
+def test_stream_sql_view_total(dataset, base_metadata):
     dataset.measures = ['Sales']
     dataset.dimensions = ['Product Name']
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
         query_builder=ViewBasedQueryBuilder
     )
     extractor = StreamingDataExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
+        metadata=base_metadata,
         configuration=configuration
     )
-    file = tempfile.NamedTemporaryFile(suffix='.csv')
-    extractor.stream_sql_to_csv(file_path=file.name, chunk_size=1000)
+    # Streaming totals come from a separate query, so don't depend on streaming the data first
     total = extractor.get_total()
-    df = pd.read_csv(file)
-    assert len(df) == 10194
     assert round(total, 2) == 2326534.35
 
 
-def test_validate_data_on_streaming_extractor():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    # Restrict ship modes so that validation fails
-    metadata.get_metadata('Ship Mode').set_property('domain', ["First Class", "Second Class"])
+@requires_sql
+def test_validate_data_on_streaming_extractor(base_dataset, metadata):
+    # Restrict ship modes so that validation fails. The limited rows are ordered by
+    # Ship Mode, so they start with 'First Class'
+    metadata.get_metadata('Ship Mode').set_property('domain', ["Second Class", "Standard Class"])
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
     extractor = StreamingDataExtractor(
-        dataset_specification=dataset,
+        dataset_specification=base_dataset,
         metadata=metadata,
         configuration=configuration
     )
@@ -429,14 +415,156 @@ def test_validate_data_on_streaming_extractor():
         extractor.validate_data()
 
 
-def test_dataframe_extractor():
-    df = pd.read_csv(os.path.join('test', 'orders.csv'))
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    extractor = DataFrameExtractor(
+@pytest.fixture(scope='module')
+def sqlite_connection_string(orders_df, tmp_path_factory):
+    """
+    A local SQLite copy of the orders, so that streaming can be tested
+    without a database server. Use with MockTableQueryBuilder.
+    """
+    from sqlalchemy import create_engine
+    connection_string = 'sqlite:///' + str(tmp_path_factory.mktemp('sqlite') / 'orders.db')
+    orders_df.to_sql('superstore', create_engine(connection_string), index=False)
+    return connection_string
+
+
+@requires_hyper
+def test_validate_data_on_streaming_extractor_passes(base_dataset, base_metadata, sqlite_connection_string):
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        query_builder=MockTableQueryBuilder
+    )
+    extractor = StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    extractor.validate_data()
+
+
+def test_stream_to_csv_in_chunks(base_dataset, base_metadata, sqlite_connection_string, tmp_path):
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        query_builder=MockTableQueryBuilder
+    )
+    extractor = StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    file_path = extractor.stream_sql_to_csv(file_path=str(tmp_path / 'data.csv'), chunk_size=1000)
+    # The header is only written for the first chunk
+    assert csv_row_count(file_path) == 10194
+    assert csv_columns(file_path)[0] == 'Row ID'
+
+
+def test_stream_to_csv_with_compression_level(base_dataset, base_metadata, sqlite_connection_string, tmp_path):
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        query_builder=MockTableQueryBuilder
+    )
+    extractor = StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    fast_path = extractor.stream_sql_to_csv(
+        file_path=str(tmp_path / 'fast.csv'), chunk_size=CHUNK_SIZE, compress_using_gzip=True
+    )
+    small_path = extractor.stream_sql_to_csv(
+        file_path=str(tmp_path / 'small.csv'), chunk_size=CHUNK_SIZE, compress_using_gzip=True, compression_level=9
+    )
+    assert csv_row_count(fast_path) == 10194
+    assert csv_row_count(small_path) == 10194
+    assert os.path.getsize(small_path) < os.path.getsize(fast_path)
+
+
+def test_stream_total_with_row_limit(base_dataset, base_metadata, sqlite_connection_string, tmp_path):
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        schema='main',
+        view='superstore',
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
+    )
+    extractor = StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    file_path = extractor.stream_sql_to_csv(file_path=str(tmp_path / 'data.csv'), chunk_size=40)
+    # The total is over the same rows that were streamed, not the whole table
+    df = pd.read_csv(file_path)
+    assert len(df) == 100
+    assert round(extractor.get_total(), 4) == round(df['Sales'].sum(), 4)
+
+
+def test_stream_totals(dataset, base_metadata, sqlite_connection_string):
+    dataset.measures = ['Sales', 'Profit']
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        schema='main',
+        view='superstore',
+        query_builder=ViewBasedQueryBuilder
+    )
+    extractor = StreamingDataExtractor(
         dataset_specification=dataset,
-        metadata=metadata,
-        dataframe=df
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    totals = extractor.get_totals()
+    assert list(totals) == ['Sales', 'Profit']
+    assert round(totals['Sales'], 4) == 2326534.3543
+    assert round(totals['Profit'], 4) == 292296.8146
+    assert round(extractor.get_total(measure='Profit'), 4) == 292296.8146
+
+
+def test_stream_total_repeatedly(base_dataset, base_metadata, sqlite_connection_string):
+    configuration = Configuration(
+        connection_string=sqlite_connection_string,
+        schema='main',
+        view='superstore',
+        query_builder=ViewBasedQueryBuilder
+    )
+    extractor = StreamingDataExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        configuration=configuration
+    )
+    # More calls than the engine's pool allows connections (5 + 10 overflow),
+    # so this hangs if connections aren't returned to the pool
+    for _ in range(20):
+        assert round(extractor.get_total(), 4) == 2326534.3543
+
+
+def test_dataframe_extractor(base_dataset, base_metadata, orders_df):
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
     )
     assert extractor.validate_data()
     assert extractor.get_total() == 2326534.3543
+
+
+def test_dataframe_extractor_totals(base_dataset, base_metadata, orders_df):
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
+    )
+    # Profit Ratio is a calculated field, so isn't totalled by default
+    totals = extractor.get_totals()
+    assert list(totals.keys()) == ['Sales', 'Profit', 'Discount']
+    assert totals['Sales'] == extractor.get_total(measure='Sales')
+
+
+def test_data_frame_is_only_minimised_once(base_dataset, base_metadata, orders_df):
+    extractor = DataFrameExtractor(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        dataframe=orders_df.copy(deep=False)
+    )
+    extractor.validate_data()
+    df = extractor.get_data_frame()
+    extractor.get_total()
+    assert extractor.get_data_frame() is df
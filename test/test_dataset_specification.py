@@ -1,10 +1,10 @@
-import os
-
 from mario.dataset_specification import dataset_from_json, dataset_from_manifest, dataset_from_excel
 
+from test.helpers import TEST_DIR
+
 
 def test_import_dataset():
-    specification_file = os.path.join('test', 'dataset.json')
+    specification_file = TEST_DIR / 'dataset.json'
     specification = dataset_from_json(file_path=specification_file)
 
     assert specification.collection == 'superstore'
@@ -13,7 +13,7 @@ def test_import_dataset():
 
 
 def test_import_dataset_from_manifest():
-    specification_file = os.path.join('test', 'manifest.json')
+    specification_file = TEST_DIR / 'manifest.json'
     specification = dataset_from_manifest(file_path=specification_file)
 
     assert specification.name == 'test@jisc.ac.uk'
@@ -21,7 +21,7 @@ def test_import_dataset_from_manifest():
 
 
 def test_import_dataset_from_excel():
-    specification_file = os.path.join('test', 'SpecificationInputTemplate.xlsx')
+    specification_file = TEST_DIR / 'SpecificationInputTemplate.xlsx'
     specification = dataset_from_excel(file_path=specification_file)
 
     assert specification.name == 'Item 1'
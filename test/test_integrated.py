@@ -1,67 +1,58 @@
 import os
 
-import pandas as pd
 import pytest
 
-from mario.data_extractor import Configuration, HyperFile, DataExtractor, StreamingDataExtractor
+from mario.data_extractor import Configuration, HyperFile, DataExtractor, DataFrameExtractor, StreamingDataExtractor
 from mario.dataset_builder import DatasetBuilder, Format
-from mario.dataset_specification import dataset_from_json, Constraint, dataset_from_manifest
-from mario.metadata import metadata_from_json, metadata_from_manifest
+from mario.dataset_specification import Constraint
 from mario.query_builder import SubsetQueryBuilder, ViewBasedQueryBuilder
 
+from test.helpers import csv_row_count
 
-def test_integration_tdsx():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
+CONNECTION_STRING = os.environ.get('CONNECTION_STRING')
+requires_sql = pytest.mark.skipif(not CONNECTION_STRING,
+                                  reason="Skipping SQL test as no database configured")
+
+
+def test_integration_tdsx(dataset, metadata, orders_hyper, tmp_path):
+    configuration = Configuration(file_path=orders_hyper)
     extractor = HyperFile(configuration=configuration, dataset_specification=dataset, metadata=metadata)
     builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', dataset.collection, dataset.name + '.tdsx')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.tdsx')
     builder.build(file_path=path, output_format=Format.TABLEAU_PACKAGED_DATASOURCE)
 
 
-def test_integration_csv():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
+def test_integration_csv(dataset, metadata, orders_hyper, tmp_path):
+    configuration = Configuration(file_path=orders_hyper)
     extractor = HyperFile(configuration=configuration, dataset_specification=dataset, metadata=metadata)
     builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', dataset.collection, dataset.name + '.csv')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.csv')
     builder.build(file_path=path, output_format=Format.CSV)
 
 
-def test_integration_excel():
-    dataset = dataset_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    metadata = metadata_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
-    extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
-    builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', 'test_integration_excel', 'data.xlsx')
-    os.makedirs(os.path.join('output', 'test_integration_excel'), exist_ok=True)
+def test_integration_excel(manifest_dataset, manifest_metadata, orders_hyper, tmp_path):
+    # Load through a DataExtractor, so the Excel output is tested from a hyper file
+    configuration = Configuration(file_path=orders_hyper)
+    extractor = DataExtractor(configuration=configuration, dataset_specification=manifest_dataset, metadata=manifest_metadata)
+    builder = DatasetBuilder(dataset_specification=manifest_dataset, metadata=manifest_metadata, data=extractor)
+    path = os.path.join(tmp_path, 'data.xlsx')
     builder.build(file_path=path, output_format=Format.EXCEL_PIVOT, template_path='excel_template.xlsx')
 
 
-def test_integration_excel_info_only():
-    dataset = dataset_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    metadata = metadata_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
-    extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
-    builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', 'test_integration_excel_info', 'info.xlsx')
-    os.makedirs(os.path.join('output', 'test_integration_excel_info'), exist_ok=True)
+def test_integration_excel_info_only(manifest_dataset, manifest_metadata, orders_hyper_df, tmp_path):
+    extractor = DataFrameExtractor(
+        dataframe=orders_hyper_df.copy(deep=False),
+        dataset_specification=manifest_dataset,
+        metadata=manifest_metadata
+    )
+    builder = DatasetBuilder(dataset_specification=manifest_dataset, metadata=manifest_metadata, data=extractor)
+    path = os.path.join(tmp_path, 'info.xlsx')
     builder.build(file_path=path, output_format=Format.EXCEL_INFO_SHEET, template_path='excel_template.xlsx')
 
 
-def test_sql_extraction():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
+@requires_sql
+def test_sql_extraction(dataset, metadata, tmp_path):
     # Set up local test database, drivers and connection string to run this
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     # Add constraints so we test parameter generation
     constraint = Constraint()
     constraint.item = 'Ship Mode'
@@ -73,7 +64,7 @@ def test_sql_extraction():
     dataset.constraints.append(constraint)
 
     configuration = Configuration(
-        connection_string=os.environ.get("CONNECTION_STRING"),
+        connection_string=CONNECTION_STRING,
         schema='dev',
         view='superstore',
         query_builder=SubsetQueryBuilder
@@ -84,65 +75,57 @@ def test_sql_extraction():
         configuration=configuration
     )
     extractor.validate_data()
-    sql_path = os.path.join('output', 'test_sql_extraction', 'query.sql')
-    csv_path = os.path.join('output', 'test_sql_extraction', 'data.csv')
-    os.makedirs(os.path.join('output', 'test_sql_extraction'), exist_ok=True)
+    sql_path = os.path.join(tmp_path, 'query.sql')
+    csv_path = os.path.join(tmp_path, 'data.csv')
     extractor.save_data_as_csv(csv_path)
     extractor.save_query(sql_path)
 
 
-def test_sql_extraction_using_manifest():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
+@requires_sql
+def test_sql_extraction_using_manifest(manifest_dataset, manifest_metadata, tmp_path):
     # Set up local test database, drivers and connection string to run this
-    dataset = dataset_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    metadata = metadata_from_manifest(os.path.join('test', 'manifest_superstore.json'))
     configuration = Configuration(
-        connection_string=os.environ.get("CONNECTION_STRING"),
+        connection_string=CONNECTION_STRING,
         schema='dev',
         view='superstore',
         query_builder=SubsetQueryBuilder
     )
     extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
+        dataset_specification=manifest_dataset,
+        metadata=manifest_metadata,
         configuration=configuration
     )
     extractor.validate_data()
-    sql_path = os.path.join('output', 'test_sql_extraction_using_manifest', 'query.sql')
-    csv_path = os.path.join('output', 'test_sql_extraction_using_manifest', 'data.csv')
-    os.makedirs(os.path.join('output', 'test_sql_extraction_using_manifest'), exist_ok=True)
+    sql_path = os.path.join(tmp_path, 'query.sql')
+    csv_path = os.path.join(tmp_path, 'data.csv')
     extractor.save_data_as_csv(csv_path)
     extractor.save_query(sql_path)
 
 
-def test_integration_excel_info_only_with_totals():
-    from openpyxl import Workbook, load_workbook
-    dataset = dataset_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    metadata = metadata_from_manifest(os.path.join('test', 'manifest_superstore.json'))
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
-    extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
+def test_integration_excel_info_only_with_totals(manifest_dataset, manifest_metadata, orders_hyper_df, tmp_path):
+    extractor = DataFrameExtractor(
+        dataframe=orders_hyper_df.copy(deep=False),
+        dataset_specification=manifest_dataset,
+        metadata=manifest_metadata
+    )
     total_from_query = extractor.get_total()
-    builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', 'test_integration_excel_info', 'info.xlsx')
-    os.makedirs(os.path.join('output', 'test_integration_excel_info'), exist_ok=True)
+    builder = DatasetBuilder(dataset_specification=manifest_dataset, metadata=manifest_metadata, data=extractor)
+    path = os.path.join(tmp_path, 'info.xlsx')
     builder.build(file_path=path, output_format=Format.EXCEL_INFO_SHEET, template_path='excel_template.xlsx')
-    workbook: Workbook = load_workbook(path)
-    total_from_notes = workbook.get_sheet_by_name('Notes')['B15'].value
+    from openpyxl import Workbook, load_workbook
+    workbook: Workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Notes']
+    total_from_notes = workbook['Notes']['B15'].value
+    workbook.close()
     assert total_from_notes == total_from_query
 
 
-def test_integration_csv_streaming():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+@requires_sql
+@pytest.mark.slow
+def test_integration_csv_streaming(dataset, metadata, tmp_path):
     dataset.collection = 'test_integration_csv_streaming'
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
         query_builder=ViewBasedQueryBuilder
@@ -153,25 +136,20 @@ def test_integration_csv_streaming():
         configuration=configuration
     )
     builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', dataset.collection, dataset.name + '.csv')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.csv')
     builder.build(file_path=path, output_format=Format.CSV)
-    df = pd.read_csv(path)
-    assert len(df) == 10194
+    assert csv_row_count(path) == 10194
 
 
-def test_integration_tdsx_streaming():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+@requires_sql
+def test_integration_tdsx_streaming(dataset, metadata, tmp_path):
     dataset.collection = 'test_integration_tdsx_streaming'
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     configuration = Configuration(
-        connection_string=os.environ.get('CONNECTION_STRING'),
+        connection_string=CONNECTION_STRING,
         schema="dev",
         view="superstore",
-        query_builder=ViewBasedQueryBuilder
+        query_builder=ViewBasedQueryBuilder,
+        row_limit=100
     )
     extractor = StreamingDataExtractor(
         dataset_specification=dataset,
@@ -179,22 +157,18 @@ def test_integration_tdsx_streaming():
         configuration=configuration
     )
     builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
-    path = os.path.join('output', dataset.collection, dataset.name + '.tdsx')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.tdsx')
     builder.build(file_path=path, output_format=Format.TABLEAU_PACKAGED_DATASOURCE)
 
 
-def test_remove_redundant_hierarchies():
-    metadata_file = os.path.join('test', 'metadata.json')
-    metadata = metadata_from_json(file_path=metadata_file)
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+def test_remove_redundant_hierarchies(dataset, metadata, orders_hyper, tmp_path):
     dataset.collection = 'test_remove_redundant_hierarchies'
 
     # remove an item so we have a one-item hierarchy for "Product"
     dataset.dimensions.remove("Product Name")
     assert "Product Name" not in dataset.items
 
-    configuration = Configuration(file_path=os.path.join('test', 'orders.hyper'))
+    configuration = Configuration(file_path=orders_hyper)
     extractor = HyperFile(configuration=configuration, dataset_specification=dataset, metadata=metadata)
     builder = DatasetBuilder(dataset_specification=dataset, metadata=metadata, data=extractor)
 
@@ -204,6 +178,5 @@ def test_remove_redundant_hierarchies():
     assert "Product" not in metadata.get_hierarchies()
     assert "Location" in metadata.get_hierarchies()
 
-    path = os.path.join('output', dataset.collection, dataset.name + '.tdsx')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.tdsx')
     builder.build(file_path=path, output_format=Format.TABLEAU_PACKAGED_DATASOURCE)
@@ -1,48 +1,47 @@
 import os
 
 from mario.data_extractor import Configuration, DataExtractor
-from mario.dataset_specification import dataset_from_json, dataset_from_manifest
+from mario.dataset_specification import dataset_from_manifest
 from mario.query_builder import SubsetQueryBuilder, ViewBasedQueryBuilder
-from mario.metadata import metadata_from_json, metadata_from_manifest
+from mario.metadata import metadata_from_manifest
 
+from test.helpers import TEST_DIR
 
-def test_manifest_subset():
-    dataset = dataset_from_manifest(os.path.join('test', 'manifest.json'))
-    metadata = metadata_from_manifest(os.path.join('test', 'manifest.json'))
+
+def test_manifest_subset(tmp_path):
+    dataset = dataset_from_manifest(TEST_DIR / 'manifest.json')
+    metadata = metadata_from_manifest(TEST_DIR / 'manifest.json')
     configuration = Configuration(
         view='v_student_fpe',
         schema='dbo',
         query_builder=SubsetQueryBuilder
     )
     extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
-    path = os.path.join('output', dataset.collection, dataset.name + '.sql')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '.sql')
     extractor.save_query(file_path=path)
 
 
-def test_spec_subset():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_spec_subset(base_dataset, base_metadata, tmp_path):
+    dataset = base_dataset
+    metadata = base_metadata
     configuration = Configuration(
         view='v_student_fpe',
         schema='dbo',
         query_builder=SubsetQueryBuilder
     )
     extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
-    path = os.path.join('output', dataset.collection, dataset.name + '_subset.sql')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '_subset.sql')
     extractor.save_query(file_path=path)
 
 
-def test_spec_view():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_spec_view(base_dataset, base_metadata, tmp_path):
+    dataset = base_dataset
+    metadata = base_metadata
     configuration = Configuration(
         view='v_student_fpe',
         schema='dbo',
         query_builder=ViewBasedQueryBuilder
     )
     extractor = DataExtractor(configuration=configuration, dataset_specification=dataset, metadata=metadata)
-    path = os.path.join('output', dataset.collection, dataset.name + '_view.sql')
-    os.makedirs(os.path.join('output', dataset.collection), exist_ok=True)
+    path = os.path.join(tmp_path, dataset.name + '_view.sql')
     extractor.save_query(file_path=path)
\ No newline at end of file
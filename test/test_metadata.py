@@ -1,11 +1,12 @@
-import os
-import tempfile
+import io
 
 from mario.metadata import metadata_from_json, metadata_from_excel
 
+from test.helpers import TEST_DIR
+
 
 def test_load_metadata():
-    metadata_file = os.path.join('test', 'metadata.json')
+    metadata_file = TEST_DIR / 'metadata.json'
     metadata = metadata_from_json(file_path=metadata_file)
     assert metadata.get_metadata('Ship Mode') is not None
     assert metadata.get_metadata('Ship Mode').description is not None
@@ -14,24 +15,24 @@ def test_load_metadata():
 
 
 def test_save_metadata():
-    metadata_file = os.path.join('test', 'metadata.json')
+    metadata_file = TEST_DIR / 'metadata.json'
     metadata = metadata_from_json(file_path=metadata_file)
     metadata.set_property("fruit", "banana")
-    with tempfile.NamedTemporaryFile() as file:
-        file.close()
-        metadata.save(file_path=file.name)
-        metadata = metadata_from_json(file.name)
-        assert metadata.get_property('fruit') == 'banana'
+    file = io.StringIO()
+    metadata.save(file_path=file)
+    file.seek(0)
+    metadata = metadata_from_json(file)
+    assert metadata.get_property('fruit') == 'banana'
 
 
 def test_load_tdsa():
-    metadata_file = os.path.join('test', 'tdsa.json')
+    metadata_file = TEST_DIR / 'tdsa.json'
     metadata = metadata_from_json(file_path=metadata_file)
     assert metadata.get_metadata('Ship Mode') is not None
 
 
 def test_load_excel():
-    metadata_file = os.path.join('test', 'spec_example.xlsx')
+    metadata_file = str(TEST_DIR / 'spec_example.xlsx')
     metadata = metadata_from_excel(file_path=metadata_file)
     domain = metadata.get_metadata('Nationality (UK/ EU/ Non-EU/ Unknown) (2022/23 onwards)').get_property('domain')
     assert 'UK' in domain
@@ -43,15 +44,36 @@ def test_load_excel():
     assert 'First Class' in domain
 
 
-def test_get_hierarchies():
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_get_hierarchies(base_metadata):
+    metadata = base_metadata
     hierarchies = metadata.get_hierarchies()
     assert len(hierarchies) == 2
     assert 'Product' in hierarchies
     assert 'Location' in hierarchies
 
 
-def test_get_hierarchy():
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_get_hierarchy(base_metadata):
+    metadata = base_metadata
     products = metadata.get_hierarchy('Product')
-    assert products == ['Category', 'Product Name']
\ No newline at end of file
+    assert products == ['Category', 'Product Name']
+
+
+def test_get_metadata_after_rename(metadata):
+    item = metadata.get_metadata('Region')
+    item.name = 'Area'
+    assert metadata.get_metadata('Area') is item
+    assert metadata.get_metadata('Region') is None
+
+
+def test_remove_item(metadata):
+    item = metadata.get_metadata('Region')
+    metadata.remove_item(item)
+    assert item not in metadata.items
+    assert metadata.get_metadata('Region') is None
+
+
+def test_get_hierarchy_map(base_metadata):
+    hierarchies = base_metadata.get_hierarchy_map()
+    assert sorted(hierarchies) == sorted(base_metadata.get_hierarchies())
+    assert hierarchies['Product'] == base_metadata.get_hierarchy('Product')
+    assert hierarchies['Location'] == base_metadata.get_hierarchy('Location')
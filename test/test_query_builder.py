@@ -138,3 +138,148 @@ def test_subset_query_builder_with_calculated_field():
     query = query_builder.create_query()
     assert query[0] == 'SELECT "fruit",SUM("price") "price",SUM("profit") "profit" ' \
                        'FROM "dbo"."v_extract_test" GROUP BY "fruit"'
+
+
+def test_query_builder_with_row_limit():
+    dataset_specification = DatasetSpecification()
+
+    metadata = Metadata()
+
+    configuration = Configuration(schema='dbo', view='v_extract_test', row_limit=100)
+
+    query_builder = ViewBasedQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_query()
+    assert query[0] == 'SELECT * FROM "dbo"."v_extract_test" LIMIT 100'
+
+
+def test_subset_query_builder_with_row_limit():
+    dataset_specification = DatasetSpecification()
+    dataset_specification.dimensions.append('fruit')
+    dataset_specification.measures.append('volume')
+
+    metadata = Metadata()
+    for field in ['fruit', 'volume']:
+        item = Item()
+        item.name = field
+        metadata.add_item(item)
+
+    configuration = Configuration(schema='dbo', view='v_extract_test', row_limit=100)
+
+    query_builder = SubsetQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_query()
+    assert query[0] == 'SELECT "fruit",SUM("volume") "volume" FROM "dbo"."v_extract_test" ' \
+                       'GROUP BY "fruit" ORDER BY "fruit" LIMIT 100'
+
+
+def test_totals_query_with_row_limit():
+    dataset_specification = DatasetSpecification()
+
+    metadata = Metadata()
+
+    configuration = Configuration(schema='dbo', view='v_extract_test', row_limit=100)
+
+    query_builder = ViewBasedQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_totals_query(measure='volume')
+    assert query[0] == 'SELECT SUM("volume") FROM (SELECT * FROM "dbo"."v_extract_test" LIMIT 100) AS "limited"'
+    query = query_builder.create_totals_query()
+    assert query[0] == 'SELECT COUNT(*) FROM (SELECT * FROM "dbo"."v_extract_test" LIMIT 100) AS "limited"'
+
+
+def test_subset_totals_query_with_row_limit():
+    dataset_specification = DatasetSpecification()
+    dataset_specification.dimensions.append('fruit')
+    dataset_specification.measures.append('volume')
+
+    metadata = Metadata()
+    for field in ['fruit', 'volume']:
+        item = Item()
+        item.name = field
+        metadata.add_item(item)
+
+    configuration = Configuration(schema='dbo', view='v_extract_test', row_limit=100)
+
+    query_builder = SubsetQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_totals_query()
+    assert query[0] == 'SELECT SUM("sq0"."volume") "volume" FROM (' \
+                       'SELECT "fruit",SUM("volume") "volume" FROM "dbo"."v_extract_test" ' \
+                       'GROUP BY "fruit" ORDER BY "fruit" LIMIT 100) "sq0"'
+
+
+def test_totals_query_with_multiple_measures():
+    dataset_specification = DatasetSpecification()
+
+    metadata = Metadata()
+
+    configuration = Configuration(schema='dbo', view='v_extract_test')
+
+    query_builder = ViewBasedQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_totals_query(measures=['volume', 'weight'])
+    assert query[0] == 'SELECT SUM("volume"), SUM("weight") FROM "dbo"."v_extract_test"'
+
+
+def test_subset_totals_query_with_multiple_measures():
+    dataset_specification = DatasetSpecification()
+    dataset_specification.dimensions.append('fruit')
+    dataset_specification.measures.append('volume')
+    dataset_specification.measures.append('weight')
+
+    metadata = Metadata()
+    for field in ['fruit', 'volume', 'weight']:
+        item = Item()
+        item.name = field
+        metadata.add_item(item)
+
+    configuration = Configuration(schema='dbo', view='v_extract_test')
+
+    query_builder = SubsetQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_totals_query(measures=['volume', 'weight'])
+    assert query[0] == 'SELECT SUM("volume") "volume",SUM("weight") "weight" FROM "dbo"."v_extract_test"'
+
+
+def test_query_builder_with_row_limit_orders_rows():
+    dataset_specification = DatasetSpecification()
+    dataset_specification.dimensions.append('fruit')
+    dataset_specification.measures.append('volume')
+
+    metadata = Metadata()
+
+    configuration = Configuration(schema='dbo', view='v_extract_test', row_limit=100)
+
+    query_builder = ViewBasedQueryBuilder(
+        dataset_specification=dataset_specification,
+        metadata=metadata,
+        configuration=configuration
+    )
+
+    query = query_builder.create_query()
+    assert query[0] == 'SELECT * FROM "dbo"."v_extract_test" ORDER BY "fruit","volume" LIMIT 100'
@@ -2,68 +2,60 @@ import os
 
 import pytest
 
-from mario.data_extractor import DataExtractor, Configuration
-from mario.dataset_specification import dataset_from_json
-from mario.metadata import metadata_from_json, Item
+from mario.data_extractor import Configuration, DataFrameExtractor
+from mario.metadata import Item
 from mario.validation import DataFrameValidator, HyperValidator, Validator, SqlValidator
 
+CONNECTION_STRING = os.environ.get('CONNECTION_STRING')
+requires_sql = pytest.mark.skipif(not CONNECTION_STRING,
+                                  reason="Skipping SQL test as no database configured")
 
-def get_validator(nulls=False, hyperfile=False):
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    # postal code has NULLs
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    filename = 'orders_with_nulls.hyper' if nulls else 'orders.hyper'
-    hyper_path = os.path.join('test', filename)
 
-    configuration = Configuration(
-        file_path=hyper_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-    validator = DataFrameValidator(
+VALIDATOR_KINDS = ['dataframe', 'hyper']
+
+
+def get_validator(kind, request, hyper, dataset, metadata, minimise=True):
+    """
+    Creates the validator under test for one of the hyper file fixtures
+    :param kind: 'dataframe' to validate the extract loaded into pandas, or 'hyper' to validate the file itself
+    :param request: the pytest request, used to look up the fixtures
+    :param hyper: the name of the hyper file fixture, e.g. 'orders_hyper'. The
+    dataframe is taken from the matching session fixture, e.g. 'orders_hyper_df',
+    so the file is only read into pandas once per session
+    :param dataset: the dataset specification
+    :param metadata: the metadata
+    :param minimise: whether to drop the columns not in the specification before validating a dataframe
+    :return: the validator
+    """
+    if kind == 'hyper':
+        return HyperValidator(
+            dataset_specification=dataset,
+            metadata=metadata,
+            hyper_file_path=request.getfixturevalue(hyper)
+        )
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame()
+        dataframe=request.getfixturevalue(hyper + '_df').copy(deep=False)
     )
-    hyper_validator = HyperValidator(
+    return DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        hyper_file_path=hyper_path
+        data=extractor.get_data_frame(minimise=minimise)
     )
-    if hyperfile:
-        return hyper_validator
-    return validator
 
 
-def test_no_nulls():
-    validator = get_validator()
+@pytest.mark.parametrize('kind', VALIDATOR_KINDS)
+def test_no_nulls(kind, request, base_dataset, base_metadata):
+    validator = get_validator(kind, request, 'orders_hyper', base_dataset, base_metadata)
     assert validator.validate_data(allow_nulls=False)
     assert len(validator.errors) == 0
 
 
-def test_no_nulls_hyper():
-    validator = get_validator(hyperfile=True)
-    assert validator.validate_data(allow_nulls=False)
-    assert len(validator.errors) == 0
-
-
-def test_nulls():
-    validator = get_validator(nulls=True)
-    validator.validate_data(allow_nulls=True)
-    assert len(validator.errors) == 0
-    assert "Validation warning: 'Postal Code' contains NULLs" in validator.warnings
-
-    with pytest.raises(ValueError):
-        validator.validate_data(allow_nulls=False)
-    assert len(validator.errors) == 1
-    assert "Validation error: 'Postal Code' contains NULLs" in validator.errors
-
-
-def test_nulls_hyper():
-    validator = get_validator(nulls=True, hyperfile=True)
+@pytest.mark.parametrize('kind', VALIDATOR_KINDS)
+def test_nulls(kind, request, base_dataset, base_metadata):
+    # postal code has NULLs
+    validator = get_validator(kind, request, 'orders_with_nulls_hyper', base_dataset, base_metadata)
     validator.validate_data(allow_nulls=True)
     assert len(validator.errors) == 0
     assert "Validation warning: 'Postal Code' contains NULLs" in validator.warnings
@@ -74,98 +66,29 @@ def test_nulls_hyper():
     assert "Validation error: 'Postal Code' contains NULLs" in validator.errors
 
 
-def test_missing_column():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
+@pytest.mark.parametrize('kind', VALIDATOR_KINDS)
+def test_missing_column(kind, request, dataset, metadata):
     dataset.dimensions.append('bigliness')
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
     item = Item()
-    item.name='bigliness'
+    item.name = 'bigliness'
     metadata.add_item(item)
-    hyper_path = os.path.join('test', 'orders.hyper')
 
-    configuration = Configuration(
-        file_path=hyper_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-
-    validator = DataFrameValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
-    )
+    validator = get_validator(kind, request, 'orders_hyper', dataset, metadata, minimise=False)
 
     with pytest.raises(ValueError):
         validator.validate_data(allow_nulls=True)
     assert len(validator.errors) == 1
     assert validator.errors[0] == "Validation error: 'bigliness' in specification is missing from dataset"
 
-
-def test_missing_column_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    dataset.dimensions.append('bigliness')
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    item = Item()
-    item.name = 'bigliness'
-    metadata.add_item(item)
-    hyper_path = os.path.join('test', 'orders.hyper')
-
-    hyper_validator = HyperValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        hyper_file_path=hyper_path
-    )
-    with pytest.raises(ValueError):
-        hyper_validator.validate_data(allow_nulls=True)
-    assert len(hyper_validator.errors) == 1
-    assert hyper_validator.errors[0] == "Validation error: 'bigliness' in specification is missing from dataset"
-
 # TODO
 # Range checks
 
-def test_domain_check():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    item = metadata.get_metadata('Ship Mode')
-    item.set_property('domain', ["First Class", "Second Class", "Standard Class"])
-    hyper_path = os.path.join('test', 'orders.hyper')
-
-    configuration = Configuration(
-        file_path=hyper_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-
-    validator = DataFrameValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
-    )
-
-    with pytest.raises(ValueError):
-        validator.validate_data(allow_nulls=True)
-    assert len(validator.errors) == 1
-    assert validator.errors[0] == "Validation error: 'Same Day' is not in domain of 'Ship Mode'"
-
-
-def test_domain_check_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@pytest.mark.parametrize('kind', VALIDATOR_KINDS)
+def test_domain_check(kind, request, base_dataset, metadata):
     item = metadata.get_metadata('Ship Mode')
     item.set_property('domain', ["First Class", "Second Class", "Standard Class"])
-    hyper_path = os.path.join('test', 'orders.hyper')
 
-    validator = HyperValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        hyper_file_path=hyper_path
-    )
+    validator = get_validator(kind, request, 'orders_hyper', base_dataset, metadata, minimise=False)
 
     with pytest.raises(ValueError):
         validator.validate_data(allow_nulls=True)
@@ -173,27 +96,12 @@ def test_domain_check_hyper():
     assert validator.errors[0] == "Validation error: 'Same Day' is not in domain of 'Ship Mode'"
 
 
-def test_range_check():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@pytest.mark.parametrize('kind', VALIDATOR_KINDS)
+def test_range_check(kind, request, base_dataset, metadata):
     item = metadata.get_metadata('Discount')
     item.set_property('range', [0.0, 0.2])
-    hyper_path = os.path.join('test', 'orders.hyper')
 
-    configuration = Configuration(
-        file_path=hyper_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-
-    validator = DataFrameValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
-    )
+    validator = get_validator(kind, request, 'orders_hyper', base_dataset, metadata, minimise=False)
 
     with pytest.raises(ValueError):
         validator.validate_data(allow_nulls=True)
@@ -201,33 +109,13 @@ def test_range_check():
     assert validator.errors[0] == "Validation error: 'Discount': '0.8' is greater than '0.2'"
 
 
-def test_range_check_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    item = metadata.get_metadata('Discount')
-    item.set_property('range', [0.0, 0.2])
-    hyper_path = os.path.join('test', 'orders.hyper')
-
-    validator = HyperValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        hyper_file_path=hyper_path
-    )
-
-    with pytest.raises(ValueError):
-        validator.validate_data(allow_nulls=True)
-    assert len(validator.errors) == 1
-    assert validator.errors[0] == "Validation error: 'Discount': '0.8' is greater than '0.2'"
-
-
-def test_multiple_errors_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_multiple_errors_hyper(base_dataset, metadata, orders_with_nulls_hyper):
+    dataset = base_dataset
     item = metadata.get_metadata('Discount')
     item.set_property('range', [0.0, 0.2])
     item = metadata.get_metadata('Ship Mode')
     item.set_property('domain', ["First Class", "Second Class", "Standard Class"])
-    hyper_path = os.path.join('test', 'orders_with_nulls.hyper')
+    hyper_path = orders_with_nulls_hyper
 
     validator = HyperValidator(
         dataset_specification=dataset,
@@ -243,52 +131,43 @@ def test_multiple_errors_hyper():
     assert "Validation error: 'Postal Code' contains NULLs" in validator.errors
 
 
-def test_pattern_validation_passes():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    dataset.dimensions.append('Order Identifier')
-    file_path = os.path.join('test', 'orders.csv')
+def test_nulls_in_float_column(base_dataset, base_metadata, orders_df):
+    data = orders_df.copy()
+    data.loc[0, 'Discount'] = float('nan')
 
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
+    validator = DataFrameValidator(
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        data=data
     )
 
+    validator.validate_data(allow_nulls=True)
+    assert "Validation warning: 'Discount' contains NULLs" in validator.warnings
+
+
+def test_pattern_validation_passes(dataset, base_metadata, orders_df):
+    metadata = base_metadata
+    dataset.dimensions.append('Order Identifier')
+
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=orders_df
     )
 
     validator.validate_data(allow_nulls=True)
     assert len(validator.errors) == 0
 
 
-def test_pattern_validation_fails():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+def test_pattern_validation_fails(dataset, metadata, orders_df):
     dataset.dimensions.append('Order Identifier')
     item = metadata.get_metadata('Order Identifier')
     item.set_property('pattern', 'US-20\d\d-\d{6}')
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
 
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=orders_df
     )
 
     with pytest.raises(ValueError):
@@ -297,24 +176,14 @@ def test_pattern_validation_fails():
     assert "Validation error: 'Order Identifier': 'CA-2019-115238' does not match the pattern 'US-20\\d\\d-\\d{6}'" in validator.errors
 
 
-def test_get_hierarchy_data():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
+def test_get_hierarchy_data(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
 
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=orders_df
     )
 
     dimensions = validator.__get_data_for_hierarchy__('Product')
@@ -322,34 +191,24 @@ def test_get_hierarchy_data():
     assert len(dimensions.columns) == 2
 
 
-def test_check_hierarchies():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
+def test_check_hierarchies(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
 
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=orders_df
     )
     validator.check_hierarchies()
 
     assert validator.errors == ["Inconsistent hierarchy: 92024 at level Postal Code is represented in multiple higher level categories ('United States', 'West', 'California', 'Encinitas') and ('United States', 'West', 'California', 'San Diego')."]
 
 
-def test_check_hierarchies_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.hyper')
+def test_check_hierarchies_hyper(base_dataset, base_metadata, orders_hyper):
+    dataset = base_dataset
+    metadata = base_metadata
+    file_path = orders_hyper
 
     validator = HyperValidator(
         dataset_specification=dataset,
@@ -361,18 +220,13 @@ def test_check_hierarchies_hyper():
     assert validator.errors == ["Inconsistent hierarchy: 92024 at level Postal Code is represented in multiple higher level categories ('United States', 'West', 'California', 'Encinitas') and ('United States', 'West', 'California', 'San Diego')."]
 
 
-def test_category_anomalies():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
+def test_category_anomalies(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
         metadata=metadata,
-        configuration=configuration
+        dataframe=orders_df.copy(deep=False)
     )
 
     # Introduce a segmentation variable
@@ -382,56 +236,31 @@ def test_category_anomalies():
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=df
     )
     validator.check_category_anomalies('Year')
 
     assert "Validation warning: 'Ship Mode' has potentially anomalous data when segmented by 'Year'" in validator.warnings
 
 
-def test_category_anomalies_hyper():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.hyper')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
-
-    # Introduce a segmentation variable
-    df = extractor.get_data_frame()
-    df['Year'] = df['Ship Date'].astype(str).str[0:4]
-
-    output_file_path = os.path.join('output', 'orders_with_segmentation.hyper')
-    extractor.save_data_as_hyper(file_path=output_file_path, minimise=False)
-
+def test_category_anomalies_hyper(base_dataset, base_metadata, segmentation_hyper):
     validator = HyperValidator(
-        dataset_specification=dataset,
-        metadata=metadata,
-        hyper_file_path=output_file_path
+        dataset_specification=base_dataset,
+        metadata=base_metadata,
+        hyper_file_path=segmentation_hyper
     )
     validator.check_category_anomalies('Year')
 
     assert "Validation warning: 'Ship Mode' has potentially anomalous data when segmented by 'Year'" in validator.warnings
 
 
-def test_all_checks():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
+def test_all_checks(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
         metadata=metadata,
-        configuration=configuration
+        dataframe=orders_df.copy(deep=False)
     )
 
     # Introduce a segmentation variable
@@ -441,7 +270,7 @@ def test_all_checks():
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=df
     )
     with pytest.raises(ValueError):
         validator.validate_data(check_hierarchies=True, detect_anomalies=True, segmentation='Year')
@@ -449,18 +278,15 @@ def test_all_checks():
     assert len(validator.warnings) == 11
 
 
-def test_all_checks_sql():
-    # Skip this test if we don't have a connection string
-    if not os.environ.get('CONNECTION_STRING'):
-        pytest.skip("Skipping SQL test as no database configured")
-
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
+@requires_sql
+def test_all_checks_sql(base_dataset, base_metadata):
+    dataset = base_dataset
+    metadata = base_metadata
 
     configuration = Configuration(
         view='superstore',
         schema='dev',
-        connection_string=os.environ.get("CONNECTION_STRING")
+        connection_string=CONNECTION_STRING
     )
 
     validator = SqlValidator(
@@ -476,23 +302,13 @@ def test_all_checks_sql():
     assert len(validator.warnings) == 7
 
 
-def test_checks_iteratively():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
-        dataset_specification=dataset,
-        metadata=metadata,
-        configuration=configuration
-    )
+def test_checks_iteratively(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=orders_df
     )
     for item in dataset.items:
         validator.errors = []
@@ -507,18 +323,13 @@ def test_checks_iteratively():
             assert len(validator.warnings) == 0
 
 
-def test_check_anomalies_single_field():
-    dataset = dataset_from_json(os.path.join('test', 'dataset.json'))
-    metadata = metadata_from_json(os.path.join('test', 'metadata.json'))
-    file_path = os.path.join('test', 'orders.csv')
-
-    configuration = Configuration(
-        file_path=file_path
-    )
-    extractor = DataExtractor(
+def test_check_anomalies_single_field(base_dataset, base_metadata, orders_df):
+    dataset = base_dataset
+    metadata = base_metadata
+    extractor = DataFrameExtractor(
         dataset_specification=dataset,
         metadata=metadata,
-        configuration=configuration
+        dataframe=orders_df.copy(deep=False)
     )
 
     # Introduce a segmentation variable
@@ -528,7 +339,7 @@ def test_check_anomalies_single_field():
     validator = DataFrameValidator(
         dataset_specification=dataset,
         metadata=metadata,
-        data=extractor.get_data_frame(minimise=False)
+        data=df
     )
     validator.check_item_for_anomalies('Ship Mode', 'Year')
     assert "Validation warning: 'Ship Mode' has potentially anomalous data when segmented by 'Year'" in validator.warnings